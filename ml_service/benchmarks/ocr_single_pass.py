@@ -0,0 +1,59 @@
+"""
+Compare two-pass OCR (image_to_string + image_to_data) with the single-pass
+mode that rebuilds the text from image_to_data.
+
+Usage (from ml_service/):
+    python benchmarks/ocr_single_pass.py [--runs 5] [image ...]
+
+Without image arguments a synthetic receipt is rendered with Pillow.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr_extractor import run_ocr  # noqa: E402
+from synthetic import render_receipt  # noqa: E402
+
+
+def time_mode(image: Image.Image, single_pass: bool, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run_ocr(image, single_pass=single_pass)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    images = [Image.open(path) for path in args.images] or [render_receipt()]
+
+    for index, image in enumerate(images):
+        two_pass_text, _ = run_ocr(image, single_pass=False)
+        single_pass_text, _ = run_ocr(image, single_pass=True)
+
+        two_pass = time_mode(image, single_pass=False, runs=args.runs)
+        single_pass = time_mode(image, single_pass=True, runs=args.runs)
+
+        two_pass_median = statistics.median(two_pass)
+        single_pass_median = statistics.median(single_pass)
+
+        print(f"image {index} ({image.width}x{image.height}), {args.runs} runs")
+        print(f"  two-pass    median {two_pass_median * 1000:8.1f} ms")
+        print(f"  single-pass median {single_pass_median * 1000:8.1f} ms")
+        print(f"  speedup     {two_pass_median / single_pass_median:.2f}x")
+        print(f"  text identical: {two_pass_text == single_pass_text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Offline benchmark for the ml_service verification pipeline.
+
+Renders synthetic receipts (varied font size, rotation and noise), then
+  1. runs each one through ocr_extractor.extract_all_text, timing the
+     load / preprocess / OCR stages, and
+  2. drives the full POST /verify endpoint in-process with a local stub in
+     place of OpenRouter, at a given concurrency.
+
+Reports throughput, p50/p95/p99 latency, peak RSS and per-stage timings,
+and writes everything as JSON so runs can be compared.
+
+Usage (from ml_service/, needs only Tesseract installed):
+    python benchmarks/pipeline.py [--receipts 20] [--concurrency 4]
+        [--llm-latency 0.3] [--local-matcher] [--output benchmark_results.json]
+
+The local matcher and pre-classifier are off by default so every receipt
+reaches the LLM stub; pass --local-matcher to measure the short-circuit
+path instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+STUB_PORT = 8099
+
+
+def configure_environment(workdir: str, port: int, local_matcher: bool = False):
+    # Must run before config is imported anywhere
+    os.environ["OPENROUTER_URL"] = f"http://127.0.0.1:{port}/api/v1/chat/completions"
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    os.environ["OCR_CACHE_ENABLED"] = "false"
+    os.environ["VERDICT_CACHE_ENABLED"] = "false"
+    os.environ["OCR_CACHE_PATH"] = os.path.join(workdir, "ocr_cache.db")
+    os.environ["JOB_QUEUE_PATH"] = os.path.join(workdir, "jobs.db")
+    os.environ["LOCAL_MATCHER_ENABLED"] = "true" if local_matcher else "false"
+    if not local_matcher:
+        os.environ["CLASSIFIER_PATH"] = os.path.join(workdir, "no_classifier")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": ordered[-1],
+    }
+
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss is in KiB on Linux; children covers tesseract and OCR workers
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def bench_extract(paths: list) -> dict:
+    from PIL import Image
+
+    import config as cfg
+    from ocr_extractor import extract_all_text, load_image_bytes, preprocess_image, run_ocr
+
+    stages = defaultdict(list)
+    totals = []
+    start = time.perf_counter()
+
+    for path in paths:
+        t0 = time.perf_counter()
+        data = load_image_bytes(path)
+        t1 = time.perf_counter()
+        image = Image.open(path)
+        if cfg.OCR_PREPROCESS:
+            image = preprocess_image(image)
+        t2 = time.perf_counter()
+        run_ocr(image)
+        t3 = time.perf_counter()
+
+        stages["load"].append(t1 - t0)
+        stages["preprocess"].append(t2 - t1)
+        stages["ocr"].append(t3 - t2)
+
+        t4 = time.perf_counter()
+        result = extract_all_text(path)
+        totals.append(time.perf_counter() - t4)
+        if not result["success"]:
+            raise RuntimeError(f"OCR failed for {path}: {result.get('error')}")
+        del data
+
+    elapsed = time.perf_counter() - start
+    return {
+        "receipts": len(paths),
+        "throughput_per_s": len(paths) / sum(totals),
+        "wall_time_s": elapsed,
+        "latency_s": percentiles(totals),
+        "stages_s": {name: percentiles(samples) for name, samples in stages.items()},
+    }
+
+
+async def bench_verify(paths: list, concurrency: int) -> dict:
+    import httpx
+
+    import main
+
+    stages = defaultdict(list)
+
+    def timed(name, func):
+        async def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                stages[name].append(time.perf_counter() - t0)
+        return wrapper
+
+    # Time the OCR and verdict stages as the endpoint sees them
+    main.ocr_engine.extract = timed("ocr", main.ocr_engine.extract)
+    main.verify_text = timed("verdict", main.verify_text)
+
+    latencies = []
+    decided_by = defaultdict(int)
+    errors = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+
+            async def one(index: int, path: str):
+                nonlocal errors
+                async with slots:
+                    t0 = time.perf_counter()
+                    response = await client.post(
+                        "/verify",
+                        json={"campaignId": f"bench-{index}", "fileUrl": path},
+                    )
+                    latencies.append(time.perf_counter() - t0)
+                if response.status_code != 200:
+                    errors += 1
+                    return
+                decided_by[(response.json().get("details") or {}).get("decided_by", "ocr_failed")] += 1
+
+            # Warm the OCR worker pool so process start-up is not measured
+            await client.post("/verify", json={"campaignId": "warmup", "fileUrl": paths[0]})
+            stages.clear()
+
+            start = time.perf_counter()
+            await asyncio.gather(*[one(i, path) for i, path in enumerate(paths)])
+            elapsed = time.perf_counter() - start
+
+    return {
+        "receipts": len(paths),
+        "concurrency": concurrency,
+        "throughput_per_s": len(paths) / elapsed,
+        "wall_time_s": elapsed,
+        "errors": errors,
+        "decided_by": dict(decided_by),
+        "latency_s": percentiles(latencies),
+        "stages_s": {name: percentiles(samples) for name, samples in stages.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the ml_service verification pipeline")
+    parser.add_argument("--receipts", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=STUB_PORT)
+    parser.add_argument("--local-matcher", action="store_true",
+                        help="Let the local matcher and pre-classifier decide receipts before the LLM")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="ml_bench_") as workdir:
+        configure_environment(workdir, args.port, args.local_matcher)
+
+        import stub_openrouter
+        from synthetic import receipt_corpus
+
+        import config as cfg
+
+        paths = []
+        corpus = receipt_corpus(args.receipts, seed=args.seed)
+        for i, (_, image) in enumerate(corpus):
+            path = os.path.join(workdir, f"receipt_{i}.png")
+            image.save(path)
+            paths.append(path)
+
+        stub = stub_openrouter.serve(port=args.port, latency=args.llm_latency, jitter=args.llm_latency / 4)
+        try:
+            extract_results = bench_extract(paths)
+            verify_results = asyncio.run(bench_verify(paths, args.concurrency))
+        finally:
+            stub.shutdown()
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "settings": {
+            "receipts": args.receipts,
+            "seed": args.seed,
+            "llm_latency_s": args.llm_latency,
+            "ocr_workers": cfg.OCR_WORKERS,
+            "ocr_single_pass": cfg.OCR_SINGLE_PASS,
+            "ocr_preprocess": cfg.OCR_PREPROCESS,
+            "local_matcher": cfg.LOCAL_MATCHER_ENABLED,
+        },
+        "corpus": [params for params, _ in corpus],
+        "extract_all_text": extract_results,
+        "verify_endpoint": verify_results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for name in ("extract_all_text", "verify_endpoint"):
+        section = results[name]
+        latency = section["latency_s"]
+        print(
+            f"{name:17} {section['throughput_per_s']:6.2f} receipts/s  "
+            f"p50 {latency['p50'] * 1000:7.1f} ms  p95 {latency['p95'] * 1000:7.1f} ms  "
+            f"p99 {latency['p99'] * 1000:7.1f} ms"
+        )
+        for stage, stats in section["stages_s"].items():
+            print(f"  {stage:15} p50 {stats['p50'] * 1000:7.1f} ms  p95 {stats['p95'] * 1000:7.1f} ms")
+    print(f"peak RSS: {results['peak_rss_mb']['self']:.0f} MB (children {results['peak_rss_mb']['children']:.0f} MB)")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
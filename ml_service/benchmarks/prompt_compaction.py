@@ -0,0 +1,77 @@
+"""
+Measure how much prompt compaction shrinks the LLM input.
+
+OCRs each receipt, builds the verification prompt from the raw Tesseract
+text and from the compacted text, and reports the estimated token counts
+(prompt_compactor.estimate_tokens, ~4 characters per token).
+
+Usage (from ml_service/):
+    python benchmarks/prompt_compaction.py [--receipts 10] [image ...]
+
+Without image arguments a synthetic corpus (with noisy scans) is used.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_verifier import build_prompt  # noqa: E402
+from ocr_extractor import extract_text_from_bytes  # noqa: E402
+from prompt_compactor import compact_ocr_text, estimate_tokens  # noqa: E402
+from synthetic import receipt_corpus  # noqa: E402
+
+CATEGORIES = ["donation", "receipt", "payment"]
+
+
+def image_bytes(image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--receipts", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.images:
+        samples = [(path, open(path, "rb").read()) for path in args.images]
+    else:
+        samples = [
+            (f"synthetic {i} {params}", image_bytes(image))
+            for i, (params, image) in enumerate(receipt_corpus(args.receipts, seed=args.seed))
+        ]
+
+    reductions = []
+    raw_total = compact_total = 0
+    for name, data in samples:
+        result = extract_text_from_bytes(data)
+        if not result["success"]:
+            print(f"{name}: OCR failed ({result.get('error')})")
+            continue
+
+        compacted = compact_ocr_text(result["text"], CATEGORIES, result["words"], result["confidences"])
+        text_tokens = (estimate_tokens(result["text"]), estimate_tokens(compacted))
+        raw_tokens = estimate_tokens(build_prompt(result["text"], CATEGORIES))
+        compact_tokens = estimate_tokens(build_prompt(compacted, CATEGORIES))
+        raw_total += raw_tokens
+        compact_total += compact_tokens
+        reductions.append(1 - compact_tokens / raw_tokens)
+
+        print(
+            f"{name}: OCR text {text_tokens[0]} -> {text_tokens[1]} tokens, "
+            f"prompt {raw_tokens} -> {compact_tokens} tokens ({reductions[-1]:.0%} smaller)"
+        )
+
+    if reductions:
+        print(f"\ntotal {raw_total} -> {compact_total} prompt tokens "
+              f"({1 - compact_total / raw_total:.0%} smaller, median {statistics.median(reductions):.0%})")
+
+
+if __name__ == "__main__":
+    main()
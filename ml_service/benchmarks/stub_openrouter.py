@@ -0,0 +1,112 @@
+"""
+Local stand-in for the OpenRouter chat completions API.
+
+Usage (from ml_service/):
+    python benchmarks/stub_openrouter.py [--port 8099] [--latency 0.2]
+        [--jitter 0.1] [--error-rate 0.0]
+
+Then point the service at it:
+    OPENROUTER_URL=http://127.0.0.1:8099/api/v1/chat/completions python main.py
+
+Every prompt gets a verdict that marks a category as found when it appears
+in the prompt's extracted text; packed /verify/batch prompts get one verdict
+per receipt. A fraction of calls (--error-rate) answer
+with HTTP 503 so retries can be exercised.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def stub_verdict(prompt: str) -> dict:
+    match = re.search(r"\*\*Categories to verify\*\*: (.*)", prompt)
+    categories = [c.strip() for c in match.group(1).split(",")] if match else []
+    text = prompt.split("**Extracted text from document**:", 1)[-1].split("**Instructions**", 1)[0].lower()
+
+    matched = [c for c in categories if c.lower() in text]
+    missing = [c for c in categories if c not in matched]
+    return {
+        "passed": bool(categories) and not missing,
+        "confidence": 0.9 if not missing else 0.2,
+        "matched_categories": matched,
+        "missing_categories": missing,
+        "explanation": "Stub verdict based on literal category matches",
+        "category_analysis": {
+            c: {"found": c in matched, "evidence": c if c in matched else "", "confidence": 0.9}
+            for c in categories
+        },
+    }
+
+
+def stub_reply(prompt: str) -> dict:
+    receipts = re.split(r"^### Receipt \d+$", prompt, flags=re.MULTILINE)
+    if len(receipts) == 1:
+        return stub_verdict(prompt)
+    return {
+        "results": [
+            {"index": index, **stub_verdict(receipt)}
+            for index, receipt in enumerate(receipts[1:])
+        ]
+    }
+
+
+def make_handler(latency: float, jitter: float, error_rate: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+            if random.random() < error_rate:
+                self.send_response(503)
+                self.end_headers()
+                return
+
+            payload = json.loads(body or b"{}")
+            prompt = payload.get("messages", [{}])[-1].get("content", "")
+            content = json.dumps(stub_reply(prompt))
+
+            data = json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]}).encode()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client cancelled this call (e.g. a losing hedge)
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def serve(port: int = 8099, latency: float = 0.2, jitter: float = 0.1, error_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Start the stub on a background thread and return the server."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency, jitter, error_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", args.port), make_handler(args.latency, args.jitter, args.error_rate)
+    )
+    print(f"Stub OpenRouter listening on http://127.0.0.1:{args.port}/api/v1/chat/completions")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
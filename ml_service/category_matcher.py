@@ -0,0 +1,171 @@
+import logging
+import re
+from typing import Optional
+
+import config as cfg
+
+logger = logging.getLogger(__name__)
+
+# Words that count as evidence for each category: the category word and
+# unambiguous variants only. Generic receipt vocabulary ("total", "card",
+# "gift", "order", ...) appears on ordinary shop receipts and must not
+# decide a verdict without the LLM. Categories not listed here are matched
+# on their own words, all of which must appear.
+CATEGORY_SYNONYMS = {
+    "donation": ["donation", "donations", "donated", "donate", "donor", "donors"],
+    "charity": ["charity", "charities", "charitable", "nonprofit", "non-profit", "501(c)(3)"],
+    "receipt": ["receipt", "receipts"],
+    "payment": ["payment", "payments", "paid"],
+    "purchase": ["purchase", "purchases", "purchased"],
+    "food": ["food", "foods", "grocery", "groceries"],
+    "medical": ["medical", "medicine", "medicines", "medication", "medications", "pharmacy", "prescription"],
+    "clothing": ["clothing", "clothes", "apparel"],
+    "shelter": ["shelter", "shelters"],
+    "education": ["education", "educational", "tuition"],
+}
+
+# Common Tesseract character confusions, folded before comparing
+OCR_CONFUSIONS = str.maketrans({"0": "o", "1": "l", "|": "l", "5": "s", "$": "s", "8": "b"})
+
+TOKEN_RE = re.compile(r"[a-z0-9()$|]+(?:-[a-z0-9]+)*")
+
+
+def normalize_token(token: str) -> str:
+    token = token.lower().translate(OCR_CONFUSIONS).replace("rn", "m")
+    return token.strip(".,:;!?'\"*#")
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, giving up early once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+# Fuzzy hits score below the default LOCAL_MATCH_MIN_CONFIDENCE, so only
+# literal evidence lets the matcher skip the LLM
+FUZZY_MATCH_CONFIDENCE = 0.7
+FUZZY_MIN_LENGTH = 6
+
+
+def max_edits(token: str) -> int:
+    if len(token) >= 8:
+        return 2
+    if len(token) >= FUZZY_MIN_LENGTH:
+        return 1
+    return 0
+
+
+class CategoryMatcher:
+    """
+    Deterministic fast path in front of the LLM.
+
+    Every synonym is normalized once into an index keyed by category. A
+    category is a list of word groups: one group of synonyms for a listed
+    category, one group per word otherwise. A receipt matches a category
+    when one of its OCR words equals a synonym in every group (score 1.0).
+    Words of FUZZY_MIN_LENGTH+ characters within a small edit distance of
+    a synonym are reported as weaker evidence, scored below the default
+    threshold.
+    """
+
+    def __init__(self, synonyms: Optional[dict] = None):
+        self._index = {}
+        for category, words in (synonyms or CATEGORY_SYNONYMS).items():
+            self._index[category.lower()] = [self._compile(words)]
+
+    @staticmethod
+    def _compile(words) -> dict:
+        normalized = {normalize_token(word) for word in words}
+        return {word: max_edits(word) for word in normalized if word}
+
+    def _groups(self, category: str) -> list:
+        key = category.lower().strip()
+        if key not in self._index:
+            # Every word is required, so a stray "supplies" or "food" cannot
+            # stand in for "medical supplies" or "baby food"
+            groups = [self._compile([word]) for word in key.split()]
+            self._index[key] = [group for group in groups if group]
+        return self._index[key]
+
+    def evidence_words(self, category: str) -> set:
+        """Every normalized word that is literal evidence for part of a category."""
+        return set().union(*self._groups(category))
+
+    @staticmethod
+    def _score_group(tokens: set, synonyms: dict) -> tuple:
+        best = (0.0, "")
+        for token in tokens:
+            if token in synonyms:
+                return 1.0, token
+            if len(token) < FUZZY_MIN_LENGTH:
+                continue
+            for synonym, limit in synonyms.items():
+                if limit == 0:
+                    continue
+                distance = edit_distance(token, synonym, limit)
+                if distance <= limit:
+                    confidence = FUZZY_MATCH_CONFIDENCE - 0.15 * (distance - 1)
+                    if confidence > best[0]:
+                        best = (confidence, token)
+        return best
+
+    def score(self, tokens: set, category: str) -> tuple:
+        """
+        Best (confidence, evidence) for a category among the normalized
+        tokens: the weakest of its groups' best matches.
+        """
+        groups = self._groups(category)
+        if not groups:
+            return 0.0, ""
+
+        results = [self._score_group(tokens, synonyms) for synonyms in groups]
+        confidence = min(confidence for confidence, _ in results)
+        if confidence == 0.0:
+            return 0.0, ""
+        return confidence, " ".join(evidence for _, evidence in results)
+
+    def match(self, ocr_words: list, categories: list, min_confidence: Optional[float] = None) -> Optional[dict]:
+        """
+        Return a verify_with_gemini-shaped verdict when every category is
+        found with at least `min_confidence`, otherwise None so the caller
+        falls back to the LLM.
+        """
+        if not categories or not ocr_words:
+            return None
+        if min_confidence is None:
+            min_confidence = cfg.LOCAL_MATCH_MIN_CONFIDENCE
+
+        tokens = {normalize_token(token) for word in ocr_words for token in TOKEN_RE.findall(word.lower())}
+        tokens.discard("")
+
+        analysis = {}
+        for category in categories:
+            confidence, evidence = self.score(tokens, category)
+            if confidence < min_confidence:
+                return None
+            analysis[category] = {"found": True, "evidence": evidence, "confidence": confidence}
+
+        confidence = min(entry["confidence"] for entry in analysis.values())
+        logger.info(f"Local matcher verified {categories} (confidence {confidence:.2f})")
+
+        return {
+            "passed": True,
+            "confidence": confidence,
+            "matched_categories": list(categories),
+            "missing_categories": [],
+            "explanation": "All categories found directly in the receipt text by the local matcher",
+            "category_analysis": analysis,
+            "decided_by": "local_matcher",
+        }
+
+
+category_matcher = CategoryMatcher()
@@ -15,14 +15,93 @@ TESSERACT_CMD = os.getenv("TESSERACT_CMD", None)
 # OCR Settings
 OCR_TIMEOUT = int(os.getenv("OCR_TIMEOUT", 30))
 OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+# "tesserocr" keeps Tesseract loaded in each worker, "pytesseract" spawns the
+# tesseract CLI per call, "auto" uses tesserocr when it is installed
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto").lower()
+# tessdata directory for the tesserocr backend (None uses Tesseract's default)
+TESSDATA_PATH = os.getenv("TESSDATA_PATH", None)
+# Rebuild the plain text from image_to_data instead of running Tesseract twice
+OCR_SINGLE_PASS = os.getenv("OCR_SINGLE_PASS", "true").lower() == "true"
+
+# Image Preprocessing (applied before OCR)
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "true").lower() == "true"
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", 300))
+OCR_MAX_PIXELS = int(os.getenv("OCR_MAX_PIXELS", 4_000_000))
+OCR_BINARIZE = os.getenv("OCR_BINARIZE", "false").lower() == "true"
+OCR_BINARIZE_THRESHOLD = int(os.getenv("OCR_BINARIZE_THRESHOLD", 160))
+
+# Strip-parallel OCR for tall receipts
+OCR_STRIPS_ENABLED = os.getenv("OCR_STRIPS_ENABLED", "true").lower() == "true"
+OCR_STRIP_WORKERS = int(os.getenv("OCR_STRIP_WORKERS", 4))
+OCR_TALL_RATIO = float(os.getenv("OCR_TALL_RATIO", 3.0))
+OCR_STRIP_MIN_HEIGHT = int(os.getenv("OCR_STRIP_MIN_HEIGHT", 800))
+OCR_STRIP_OVERLAP = int(os.getenv("OCR_STRIP_OVERLAP", 40))
+
+# PDF Receipts (rasterized and OCR'd one page at a time)
+OCR_PDF_DPI = int(os.getenv("OCR_PDF_DPI", 200))
+OCR_PDF_MAX_PAGES = int(os.getenv("OCR_PDF_MAX_PAGES", 20))
+OCR_PDF_EARLY_EXIT = os.getenv("OCR_PDF_EARLY_EXIT", "true").lower() == "true"
+
+# OCR Engine (process pool)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+OCR_QUEUE_SIZE = int(os.getenv("OCR_QUEUE_SIZE", 32))
+
+# OCR Result Cache (keyed by image content hash)
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+OCR_CACHE_MEMORY_ITEMS = int(os.getenv("OCR_CACHE_MEMORY_ITEMS", 256))
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "ocr_cache.db")
+OCR_CACHE_MAX_ROWS = int(os.getenv("OCR_CACHE_MAX_ROWS", 10000))
 
 # OpenRouter AI Configuration
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "openai/gpt-4o-mini")
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+# Local Category Matcher (answers without the LLM when every category is found)
+LOCAL_MATCHER_ENABLED = os.getenv("LOCAL_MATCHER_ENABLED", "true").lower() == "true"
+LOCAL_MATCH_MIN_CONFIDENCE = float(os.getenv("LOCAL_MATCH_MIN_CONFIDENCE", 0.85))
+
+# Proof Pre-classifier (trained offline with train_classifier.py; only settles clear rejections)
+CLASSIFIER_PATH = os.getenv("CLASSIFIER_PATH", "proof_classifier")
+CLASSIFIER_REJECT_THRESHOLD = float(os.getenv("CLASSIFIER_REJECT_THRESHOLD", 0.03))
+
+# Prompt Compaction (shrinks OCR text before it is sent to the LLM)
+PROMPT_COMPACTION_ENABLED = os.getenv("PROMPT_COMPACTION_ENABLED", "true").lower() == "true"
+PROMPT_MIN_WORD_CONFIDENCE = int(os.getenv("PROMPT_MIN_WORD_CONFIDENCE", 30))
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", 1500))
+
+# LLM Client (pooled, retried, optionally hedged)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 10))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", 0.5))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 0.95))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+# Receipts packed into one prompt by /verify/batch
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", 5))
+VERIFY_BATCH_MAX_ITEMS = int(os.getenv("VERIFY_BATCH_MAX_ITEMS", 50))
+
+# Verdict Cache (skips repeat LLM calls for identical text + categories)
+VERDICT_CACHE_ENABLED = os.getenv("VERDICT_CACHE_ENABLED", "true").lower() == "true"
+VERDICT_CACHE_TTL = int(os.getenv("VERDICT_CACHE_TTL", 24 * 60 * 60))
+VERDICT_CACHE_MAX_ITEMS = int(os.getenv("VERDICT_CACHE_MAX_ITEMS", 1024))
+
+# Verification Jobs (persistent queue processed in the background)
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", OCR_WORKERS))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1.0))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 300))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", 7 * 24 * 60 * 60))
+JOB_CALLBACK_URL = os.getenv("JOB_CALLBACK_URL", "")
 
 # HTTP Settings
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", 30))
 MAX_IMAGE_SIZE = int(os.getenv("MAX_IMAGE_SIZE", 10 * 1024 * 1024))
 
+# Response Shapes (/verify responseShape, /verify/stream response_shape)
+RESPONSE_SNIPPET_CHARS = int(os.getenv("RESPONSE_SNIPPET_CHARS", 500))
+
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
\ No newline at end of file
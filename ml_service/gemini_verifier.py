@@ -1,22 +1,32 @@
-import requests
+import asyncio
 import logging
 import json
 import config as cfg
+from llm_client import llm_client
+from metrics import LLM_PARSE_FALLBACKS, stage_timer
+from verdict_cache import verdict_cache, verdict_key
 
 logger = logging.getLogger(__name__)
 
 # Configure OpenRouter API
 OPENROUTER_API_KEY = cfg.OPENROUTER_API_KEY
 OPENROUTER_MODEL = cfg.OPENROUTER_MODEL
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_URL = cfg.OPENROUTER_URL
 
 
-def verify_with_gemini(ocr_text: str, categories: list, ocr_words: list = None) -> dict:
-    try:
-        logger.info(f"Verifying with OpenRouter - Categories: {categories}")
+def strip_code_fences(response_text: str) -> str:
+    # Remove markdown code blocks if present
+    if response_text.startswith('```json'):
+        response_text = response_text[7:]
+    if response_text.startswith('```'):
+        response_text = response_text[3:]
+    if response_text.endswith('```'):
+        response_text = response_text[:-3]
+    return response_text.strip()
 
-        # Construct prompt
-        prompt = f"""You are a verification AI that checks if a receipt or document contains specific categories of items.
+
+def build_prompt(ocr_text: str, categories: list) -> str:
+    return f"""You are a verification AI that checks if a receipt or document contains specific categories of items.
 
 **Task**: Analyze the extracted text below and determine if it contains evidence of purchases/items from the specified categories.
 
@@ -54,47 +64,38 @@ def verify_with_gemini(ocr_text: str, categories: list, ocr_words: list = None)
 
 Return ONLY valid JSON, no other text."""
 
+
+async def verify_with_gemini(ocr_text: str, categories: list, ocr_words: list = None) -> dict:
+    cache_key = None
+    if cfg.VERDICT_CACHE_ENABLED:
+        cache_key = verdict_key(ocr_text, categories)
+        cached = verdict_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Verdict cache hit - Categories: {categories}")
+            return cached
+
+    try:
+        logger.info(f"Verifying with OpenRouter - Categories: {categories}")
+
+        # Construct prompt
+        with stage_timer("prompt_build"):
+            prompt = build_prompt(ocr_text, categories)
+
         # Send request to OpenRouter
         logger.info("Sending request to OpenRouter API...")
-        response = requests.post(
-            url=OPENROUTER_URL,
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://charitable.app",
-                "X-Title": "Charit.able",
-            },
-            json={
-                "model": OPENROUTER_MODEL,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            },
-            timeout=30
-        )
-
-        response.raise_for_status()
-        response_data = response.json()
-
-        # Extract text response from OpenRouter format
-        response_text = response_data["choices"][0]["message"]["content"].strip()
-
-        # Remove markdown code blocks if present
-        if response_text.startswith('```json'):
-            response_text = response_text[7:] 
-        if response_text.startswith('```'):
-            response_text = response_text[3:]  
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
+        with stage_timer("llm_round_trip"):
+            response_text = await llm_client.complete(prompt)
+
+        response_text = strip_code_fences(response_text)
 
         # Parse JSON response
         try:
-            result = json.loads(response_text)
+            with stage_timer("json_parse"):
+                result = json.loads(response_text)
+            parsed = True
         except json.JSONDecodeError as e:
+            parsed = False
+            LLM_PARSE_FALLBACKS.inc()
             logger.error(f"Failed to parse OpenRouter response as JSON: {e}")
             logger.error(f"Response text: {response_text[:500]}")
             # Fallback 
@@ -109,6 +110,10 @@ Return ONLY valid JSON, no other text."""
 
         logger.info(f"OpenRouter verification result: passed={result['passed']}, confidence={result['confidence']:.2f}")
 
+        # Only real verdicts are cached, never the parse/error fallbacks
+        if parsed and cache_key is not None:
+            verdict_cache.put(cache_key, result)
+
         return result
 
     except Exception as e:
@@ -122,3 +127,131 @@ Return ONLY valid JSON, no other text."""
             "category_analysis": {},
             "error": str(e)
         }
+
+
+def _batch_prompt(items: list) -> str:
+    receipts = "\n\n".join(
+        f"""### Receipt {index}
+**Categories to verify**: {', '.join(categories)}
+
+**Extracted text from document**:
+{ocr_text}"""
+        for index, (ocr_text, categories) in enumerate(items)
+    )
+
+    return f"""You are a verification AI that checks if receipts or documents contain specific categories of items.
+
+**Task**: For EACH numbered receipt below, analyze its extracted text and determine if it contains evidence of purchases/items from that receipt's categories. Judge every receipt independently.
+
+{receipts}
+
+**Instructions**:
+1. Check if the text contains items, products, or references related to each category
+2. For each category, determine if there's sufficient evidence in the text
+3. Be reasonably flexible with matching (e.g., "medication" matches "medical supplies")
+4. Return a JSON response with this exact structure, one entry per receipt in receipt order:
+
+{{
+    "results": [
+        {{
+            "index": 0,
+            "passed": true/false,
+            "confidence": 0.0-1.0,
+            "matched_categories": ["list of categories found"],
+            "missing_categories": ["list of categories not found"],
+            "explanation": "Brief explanation of your decision",
+            "category_analysis": {{
+                "category_name": {{
+                    "found": true/false,
+                    "evidence": "text showing this category was found",
+                    "confidence": 0.0-1.0
+                }}
+            }}
+        }}
+    ]
+}}
+
+**Rules**:
+- Set "passed" to true only if ALL of that receipt's categories are found
+- Set confidence based on how clear the evidence is
+- Be strict but fair - require actual evidence, not just assumptions
+- If OCR text is empty or unreadable, set passed=false with low confidence
+
+Return ONLY valid JSON, no other text."""
+
+
+async def _verify_packed(items: list) -> list:
+    """Verify several receipts with one LLM call; missing entries come back as None."""
+    try:
+        logger.info(f"Verifying {len(items)} receipts with one OpenRouter call")
+        with stage_timer("prompt_build"):
+            prompt = _batch_prompt(items)
+        with stage_timer("llm_round_trip"):
+            response_text = strip_code_fences(await llm_client.complete(prompt))
+    except Exception as e:
+        logger.error(f"Batched OpenRouter verification failed: {str(e)}")
+        return [None] * len(items)
+
+    try:
+        with stage_timer("json_parse"):
+            entries = json.loads(response_text)["results"]
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"Failed to parse batched OpenRouter response: {e}")
+        LLM_PARSE_FALLBACKS.inc()
+        return [None] * len(items)
+
+    results = [None] * len(items)
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            continue
+        index = entry.pop("index", position)
+        if isinstance(index, int) and 0 <= index < len(items) and "passed" in entry and "confidence" in entry:
+            results[index] = entry
+    return results
+
+
+async def _verify_single(item: tuple) -> list:
+    return [await verify_with_gemini(*item)]
+
+
+async def verify_batch_with_gemini(items: list) -> list:
+    """
+    Verify a list of (ocr_text, categories) pairs, returning one result per
+    item in input order. Cached verdicts are reused; the rest are packed
+    LLM_BATCH_SIZE at a time into a single prompt. Receipts the model did
+    not answer for are retried individually with verify_with_gemini.
+    """
+    results = [None] * len(items)
+    keys = [None] * len(items)
+    todo = []
+
+    for i, (ocr_text, categories) in enumerate(items):
+        if cfg.VERDICT_CACHE_ENABLED:
+            keys[i] = verdict_key(ocr_text, categories)
+            results[i] = verdict_cache.get(keys[i])
+        if results[i] is None:
+            todo.append(i)
+
+    chunks = [todo[start:start + cfg.LLM_BATCH_SIZE] for start in range(0, len(todo), cfg.LLM_BATCH_SIZE)]
+    packed = await asyncio.gather(*[
+        _verify_packed([items[i] for i in chunk]) if len(chunk) > 1 else _verify_single(items[chunk[0]])
+        for chunk in chunks
+    ])
+
+    retry = []
+    for chunk, chunk_results in zip(chunks, packed):
+        for i, result in zip(chunk, chunk_results):
+            if result is None:
+                retry.append(i)
+                continue
+            results[i] = result
+            if keys[i] is not None and len(chunk) > 1:
+                verdict_cache.put(keys[i], result)
+
+    if retry:
+        logger.warning(f"Retrying {len(retry)} receipts individually")
+        singles = await asyncio.gather(*[verify_with_gemini(*items[i]) for i in retry])
+        for i, result in zip(retry, singles):
+            results[i] = result
+
+    return results
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+import config as cfg
+
+logger = logging.getLogger(__name__)
+
+# How often the cached stats behind the Prometheus gauges are refreshed
+STATS_INTERVAL = 5.0
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class RetryJob(Exception):
+    """Raised by a handler to put a job back on the queue (e.g. OCR queue full)."""
+
+
+class JobQueue:
+    """
+    Persistent verification job queue.
+
+    Jobs live in a SQLite table so they survive restarts and can be shared
+    by several uvicorn workers. A worker claims a job by taking a lease on
+    it; a job whose lease runs out (its worker died) is picked up again,
+    up to JOB_MAX_ATTEMPTS times. Results are stored for polling and,
+    when a callback URL is set, POSTed to it.
+    """
+
+    def __init__(self, path: Optional[str] = None, workers: Optional[int] = None):
+        self.path = path or cfg.JOB_QUEUE_PATH
+        self.workers = workers or cfg.JOB_WORKERS
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._handlers: Dict[str, Callable[[dict], Awaitable[dict]]] = {}
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._stats: dict = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+                "status TEXT NOT NULL, result TEXT, error TEXT, callback_url TEXT, "
+                "callback_status TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL, lease_expires REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at)")
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._connect().execute(sql, params)
+
+    # Producer side
+
+    def submit(self, kind: str, payload: dict, callback_url: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, kind, payload, status, callback_url, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), QUEUED, callback_url or cfg.JOB_CALLBACK_URL or None, time.time()),
+        )
+        # submit runs on a worker thread (asyncio.to_thread), so the event
+        # has to be set from the loop that owns it
+        if self._wakeup is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        logger.info(f"Queued {kind} job {job_id}")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "callback_status": row["callback_status"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+
+    def stats(self) -> dict:
+        now = time.time()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for row in self._execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        oldest = self._execute("SELECT MIN(created_at) AS t FROM jobs WHERE status = ?", (QUEUED,)).fetchone()["t"]
+        self._stats = {
+            "workers": self.workers,
+            "depth": counts[QUEUED],
+            "running": counts[RUNNING],
+            "done": counts[DONE],
+            "failed": counts[FAILED],
+            "oldest_queued_age": now - oldest if oldest else 0.0,
+        }
+        return self._stats
+
+    def cached_stats(self) -> dict:
+        """The last stats() result, without touching the database (for metrics)."""
+        return self._stats
+
+    # Worker side
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            # Idle workers poll constantly; a plain read (which WAL never
+            # blocks) spares them the write lock when there is nothing to take
+            if conn.execute(
+                "SELECT 1 FROM jobs WHERE status = ? OR (status = ? AND lease_expires < ?) LIMIT 1",
+                (QUEUED, RUNNING, now),
+            ).fetchone() is None:
+                return None
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, lease_expires = ? "
+                        "WHERE id = ?",
+                        (RUNNING, now, now + cfg.JOB_LEASE_SECONDS, row["id"]),
+                    )
+                conn.execute("COMMIT")
+                return row
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _finish(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires = NULL WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+        )
+
+    def _requeue(self, job_id: str):
+        # A requeue is not a failed attempt
+        self._execute(
+            "UPDATE jobs SET status = ?, attempts = attempts - 1, lease_expires = NULL WHERE id = ?",
+            (QUEUED, job_id),
+        )
+
+    def _purge(self):
+        cutoff = time.time() - cfg.JOB_RETENTION_SECONDS
+        self._execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (DONE, FAILED, cutoff))
+
+    async def _run_job(self, row: sqlite3.Row):
+        job_id = row["id"]
+        handler = self._handlers.get(row["kind"])
+
+        if row["attempts"] + 1 > cfg.JOB_MAX_ATTEMPTS:
+            await asyncio.to_thread(self._finish, job_id, FAILED, None, "Exceeded maximum attempts")
+        elif handler is None:
+            await asyncio.to_thread(self._finish, job_id, FAILED, None, f"Unknown job kind: {row['kind']}")
+        else:
+            try:
+                result = await handler(json.loads(row["payload"]))
+                await asyncio.to_thread(self._finish, job_id, DONE, result)
+                logger.info(f"Job {job_id} done")
+            except RetryJob as e:
+                logger.warning(f"Job {job_id} requeued: {e}")
+                await asyncio.to_thread(self._requeue, job_id)
+                await asyncio.sleep(cfg.JOB_POLL_INTERVAL)
+                return
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+                await asyncio.to_thread(self._finish, job_id, FAILED, None, str(e))
+
+        if row["callback_url"]:
+            await self._send_callback(job_id, row["callback_url"])
+
+    async def _send_callback(self, job_id: str, url: str):
+        job = await asyncio.to_thread(self.get, job_id)
+        status = "failed"
+        for attempt in range(3):
+            try:
+                response = await self._client.post(url, json=job)
+                if response.status_code < 500:
+                    status = f"http {response.status_code}"
+                    break
+            except httpx.HTTPError as e:
+                logger.warning(f"Callback for job {job_id} failed: {e}")
+            await asyncio.sleep(2 ** attempt)
+        await asyncio.to_thread(self._execute, "UPDATE jobs SET callback_status = ? WHERE id = ?", (status, job_id))
+
+    async def _worker(self, index: int):
+        last_purge = 0.0
+        while True:
+            try:
+                row = await asyncio.to_thread(self._claim)
+                if row is not None:
+                    await self._run_job(row)
+                    continue
+
+                if index == 0 and time.time() - last_purge > 3600:
+                    await asyncio.to_thread(self._purge)
+                    last_purge = time.time()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep the worker alive; a job it held is picked up again once its lease runs out
+                logger.error(f"Job worker {index} error: {str(e)}", exc_info=True)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=cfg.JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refresh_stats(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.stats)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not refresh job queue stats: {e}")
+            await asyncio.sleep(STATS_INTERVAL)
+
+    def register(self, kind: str, handler: Callable[[dict], Awaitable[dict]]):
+        self._handlers[kind] = handler
+
+    def start(self):
+        if self._tasks:
+            return
+        logger.info(f"Starting {self.workers} job workers")
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._client = httpx.AsyncClient(timeout=cfg.REQUEST_TIMEOUT)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._refresh_stats()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+job_queue = JobQueue()
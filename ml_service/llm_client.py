@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Optional
+
+import httpx
+
+import config as cfg
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMClient:
+    """
+    Async OpenRouter chat client.
+
+    Keeps one pooled httpx connection pool for the life of the service,
+    limits how many calls are in flight, retries 429/5xx and transport
+    errors with exponential backoff, and can hedge: when a call is slower
+    than the configured latency percentile a second identical call is
+    started and whichever answers first wins.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        hedge: Optional[bool] = None,
+    ):
+        self.url = url or cfg.OPENROUTER_URL
+        self.timeout = cfg.REQUEST_TIMEOUT
+        self.max_retries = cfg.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = cfg.LLM_RETRY_BACKOFF
+        self.hedge = cfg.LLM_HEDGE_ENABLED if hedge is None else hedge
+        self.hedge_percentile = cfg.LLM_HEDGE_PERCENTILE
+        self.hedge_min_samples = cfg.LLM_HEDGE_MIN_SAMPLES
+
+        self._concurrency = concurrency or cfg.LLM_CONCURRENCY
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._latencies = deque(maxlen=500)
+
+        self.requests = 0
+        self.retries = 0
+        self.hedged = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            headers = {
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://charitable.app",
+                "X-Title": "Charit.able",
+            }
+            if cfg.OPENROUTER_API_KEY:
+                headers["Authorization"] = f"Bearer {cfg.OPENROUTER_API_KEY}"
+
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=cfg.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=cfg.LLM_MAX_CONNECTIONS,
+                ),
+                headers=headers,
+            )
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def hedge_delay(self) -> Optional[float]:
+        """Latency percentile after which a hedged request is sent, if known."""
+        if not self.hedge or len(self._latencies) < self.hedge_min_samples:
+            return None
+        samples = sorted(self._latencies)
+        return samples[int(self.hedge_percentile * (len(samples) - 1))]
+
+    async def _post(self, payload: dict) -> httpx.Response:
+        client = self._get_client()
+        async with self._semaphore:
+            self.requests += 1
+            start = time.perf_counter()
+            response = await client.post(self.url, json=payload)
+            if response.status_code not in RETRYABLE_STATUS:
+                self._latencies.append(time.perf_counter() - start)
+            return response
+
+    async def _post_hedged(self, payload: dict) -> httpx.Response:
+        delay = self.hedge_delay()
+        first = asyncio.create_task(self._post(payload))
+        if delay is None:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        logger.info(f"LLM call exceeded {delay:.2f}s, sending hedged request")
+        self.hedged += 1
+        pending = {first, asyncio.create_task(self._post(payload))}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    def _retry_after(self, response: Optional[httpx.Response], attempt: int) -> float:
+        if response is not None:
+            header = response.headers.get("Retry-After")
+            if header and header.isdigit():
+                # A large Retry-After must not hold a verification past the request timeout
+                return min(float(header), self.timeout)
+        return self.backoff * (2 ** attempt) * (1 + random.random() * 0.25)
+
+    async def chat(self, messages: list, model: Optional[str] = None) -> dict:
+        """POST a chat completion and return the decoded JSON response."""
+        payload = {"model": model or cfg.OPENROUTER_MODEL, "messages": messages}
+        # Retries share one REQUEST_TIMEOUT budget so callers (and the
+        # server's ML_SERVICE_TIMEOUT) are not left waiting on backoff
+        deadline = time.monotonic() + self.timeout
+
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await self._post_hedged(payload)
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    return response.json()
+                error = LLMError(f"LLM returned HTTP {response.status_code}")
+            except httpx.TransportError as e:
+                error = LLMError(f"LLM request failed: {e}")
+
+            if attempt == self.max_retries:
+                raise error
+
+            wait = self._retry_after(response, attempt)
+            if time.monotonic() + wait >= deadline:
+                logger.warning(f"{error}; retry in {wait:.2f}s would exceed the {self.timeout}s budget")
+                raise error
+            logger.warning(f"{error}; retrying in {wait:.2f}s ({attempt + 1}/{self.max_retries})")
+            self.retries += 1
+            await asyncio.sleep(wait)
+
+    async def complete(self, prompt: str) -> str:
+        """Send a single user prompt and return the model's text reply."""
+        response_data = await self.chat([{"role": "user", "content": prompt}])
+        return response_data["choices"][0]["message"]["content"].strip()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "hedge_delay": self.hedge_delay(),
+        }
+
+
+llm_client = LLMClient()
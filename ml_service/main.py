@@ -1,13 +1,32 @@
+import asyncio
 import logging
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel, Field
 
 import config as cfg
-from gemini_verifier import verify_with_gemini
-from ocr_extractor import extract_all_text
+from category_matcher import category_matcher
+from gemini_verifier import verify_batch_with_gemini, verify_with_gemini
+from job_queue import RetryJob, job_queue
+from llm_client import llm_client
+from metrics import (
+    JOB_QUEUE_DEPTH,
+    JOB_QUEUE_OLDEST_AGE,
+    OCR_IN_FLIGHT,
+    OCR_QUEUED,
+    RECOMMENDATIONS,
+    REQUESTS_IN_FLIGHT,
+    stage_timer,
+)
+from ocr_cache import ocr_cache
+from ocr_engine import OCRQueueFull, ocr_engine
+from prompt_compactor import compact_ocr_text
+from proof_classifier import proof_classifier
+from verdict_cache import verdict_cache
 
 # Configure logging
 logging.basicConfig(
@@ -16,10 +35,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the OCR worker pool and job workers on startup and stop them on shutdown."""
+    ocr_engine.start()
+    proof_classifier.load()
+    job_queue.register("verify", run_verification_job)
+    job_queue.register("verify_stream", run_stream_proof_job)
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    ocr_engine.shutdown()
+    ocr_cache.close()
+    await llm_client.close()
+
+
 app = FastAPI(
     title=cfg.SERVICE_NAME,
     version=cfg.SERVICE_VERSION,
     description="ML service for verifying donation receipts and proofs for Charit.able streams",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -31,6 +67,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+OCR_IN_FLIGHT.set_function(lambda: ocr_engine.in_flight)
+OCR_QUEUED.set_function(lambda: ocr_engine.queued)
+# Scrapes run on the event loop, so the job gauges read cached stats
+JOB_QUEUE_DEPTH.set_function(lambda: job_queue.cached_stats().get("depth", 0))
+JOB_QUEUE_OLDEST_AGE.set_function(lambda: job_queue.cached_stats().get("oldest_queued_age", 0.0))
+
+
+@app.middleware("http")
+async def track_in_flight(request: Request, call_next):
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    with REQUESTS_IN_FLIGHT.track_inprogress():
+        return await call_next(request)
+
+
+# verdict: no OCR payload, snippet: verdict plus truncated ocr_text, full: everything
+ResponseShape = Literal["verdict", "snippet", "full"]
+
 
 class VerificationRequest(BaseModel):
     campaignId: str = Field(..., description="Campaign/Stream ID")
@@ -39,6 +93,7 @@ class VerificationRequest(BaseModel):
         default=["donation", "charity", "receipt", "payment"],
         description="Categories to verify against",
     )
+    responseShape: ResponseShape = Field(default="full", description="How much OCR output to return")
 
 
 class VerificationResponse(BaseModel):
@@ -47,8 +102,8 @@ class VerificationResponse(BaseModel):
     matched_categories: List[str]
     missing_categories: List[str]
     explanation: str
-    ocr_text: str
-    ocr_words: List[str]
+    ocr_text: Optional[str] = None
+    ocr_words: Optional[List[str]] = None
     details: Optional[dict] = None
 
 
@@ -60,6 +115,20 @@ class StreamProofRequest(BaseModel):
         default=["receipt", "purchase", "donation"],
         description="Expected categories for this stage",
     )
+    response_shape: ResponseShape = Field(default="full", description="How much OCR output to return")
+
+
+class VerificationJobRequest(VerificationRequest):
+    callbackUrl: Optional[str] = Field(default=None, description="URL the finished job is POSTed to")
+
+
+class StreamProofJobRequest(StreamProofRequest):
+    callback_url: Optional[str] = Field(default=None, description="URL the finished job is POSTed to")
+
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
 
 
 class StreamProofResponse(BaseModel):
@@ -70,7 +139,7 @@ class StreamProofResponse(BaseModel):
     matched_categories: List[str]
     missing_categories: List[str]
     explanation: str
-    ocr_text: str
+    ocr_text: Optional[str] = None
     recommendation: str
 
 
@@ -82,18 +151,130 @@ async def root():
         "status": "running",
         "endpoints": {
             "verify": "POST /verify - General receipt verification",
+            "verify_batch": "POST /verify/batch - Batch receipt verification",
             "verify_stream_proof": "POST /verify/stream - Stream stage proof verification",
+            "submit_verify_job": "POST /jobs/verify - Queue a receipt verification",
+            "submit_stream_proof_job": "POST /jobs/verify/stream - Queue a stream proof verification",
+            "get_job": "GET /jobs/{job_id} - Job status and result",
             "health": "GET /health - Health check",
+            "metrics": "GET /metrics - Prometheus metrics",
         },
     }
 
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "ml-verification", "version": cfg.SERVICE_VERSION}
+    return {
+        "status": "healthy",
+        "service": "ml-verification",
+        "version": cfg.SERVICE_VERSION,
+        "ocr_engine": ocr_engine.stats(),
+        "ocr_cache": ocr_cache.stats(),
+        "verdict_cache": verdict_cache.stats(),
+        "llm_client": llm_client.stats(),
+        # SQLite queries; keep them off the event loop
+        "jobs": await asyncio.to_thread(job_queue.stats),
+        "classifier_loaded": proof_classifier.loaded,
+    }
+
 
+async def prompt_text(ocr_result: dict, categories: List[str]) -> str:
+    """The OCR text as it should appear in the LLM prompt."""
+    if not cfg.PROMPT_COMPACTION_ENABLED:
+        return ocr_result["text"]
+    # Multi-page OCR text takes long enough to compact to stall the event loop
+    with stage_timer("prompt_compaction"):
+        return await asyncio.to_thread(
+            compact_ocr_text,
+            ocr_result["text"],
+            categories,
+            words=ocr_result["words"],
+            confidences=ocr_result.get("confidences"),
+        )
+
+
+def local_verdict(ocr_result: dict, categories: List[str]) -> Optional[dict]:
+    """A verdict from the local matcher, or a rejection from the pre-classifier, if either is sure."""
+    if cfg.LOCAL_MATCHER_ENABLED:
+        local_result = category_matcher.match(ocr_result["words"], categories)
+        if local_result is not None:
+            return local_result
+    return proof_classifier.classify(ocr_result["text"], categories)
+
+
+async def verify_text(ocr_result: dict, categories: List[str]) -> dict:
+    """Try the local matcher and pre-classifier first; only ask the LLM when they cannot decide."""
+    local_result = local_verdict(ocr_result, categories)
+    if local_result is not None:
+        return local_result
+
+    return await verify_with_gemini(
+        ocr_text=await prompt_text(ocr_result, categories),
+        categories=categories,
+        ocr_words=ocr_result["words"],
+    )
+
+
+def shape_ocr_text(text: str, shape: str) -> Optional[str]:
+    if shape == "verdict":
+        return None
+    if shape == "snippet" and len(text) > cfg.RESPONSE_SNIPPET_CHARS:
+        return text[:cfg.RESPONSE_SNIPPET_CHARS]
+    return text
+
+
+def ocr_failure_response(request: VerificationRequest, ocr_result: dict) -> VerificationResponse:
+    return VerificationResponse(
+        passed=False,
+        confidence=0.0,
+        matched_categories=[],
+        missing_categories=request.categories,
+        explanation=f"Failed to extract text from image: {ocr_result.get('error', 'Unknown error')}",
+        ocr_text=shape_ocr_text("", request.responseShape),
+        ocr_words=[] if request.responseShape == "full" else None,
+        details={"error": ocr_result.get("error"), "ocr_cached": False},
+    )
 
-@app.post("/verify", response_model=VerificationResponse)
+
+def build_verification_response(
+    request: VerificationRequest, ocr_result: dict, ai_result: dict
+) -> VerificationResponse:
+    extracted_text = ocr_result["text"]
+    extracted_words = ocr_result["words"]
+
+    passed = ai_result.get("passed", False)
+    confidence = ai_result.get("confidence", 0.0)
+    matched = ai_result.get("matched_categories", [])
+    missing = ai_result.get("missing_categories", request.categories)
+    explanation = ai_result.get("explanation", "No explanation provided")
+
+    logger.info(f"Verification complete: passed={passed}, confidence={confidence:.2f}")
+    logger.info(f"Matched: {matched}, Missing: {missing}")
+
+    return VerificationResponse(
+        passed=passed,
+        confidence=confidence,
+        matched_categories=matched,
+        missing_categories=missing,
+        explanation=explanation,
+        ocr_text=shape_ocr_text(extracted_text, request.responseShape),
+        ocr_words=extracted_words if request.responseShape == "full" else None,
+        details={
+            "ocr_confidence": ocr_result["confidence"],
+            "word_count": len(extracted_words),
+            "ocr_cached": ocr_result.get("cached", False),
+            "decided_by": ai_result.get("decided_by", "llm"),
+            "category_analysis": ai_result.get("category_analysis", {}),
+        },
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.post("/verify", response_model=VerificationResponse, response_model_exclude_none=True)
 async def verify_categories(request: VerificationRequest):
     """
     Verify if a receipt/document contains specific categories.
@@ -105,65 +286,87 @@ async def verify_categories(request: VerificationRequest):
 
         # Step 1: Extract text via OCR
         logger.info("Step 1: Extracting text via OCR")
-        ocr_result = extract_all_text(request.fileUrl)
+        ocr_result = await ocr_engine.extract(request.fileUrl, request.categories)
 
         if not ocr_result.get("success"):
-            return VerificationResponse(
-                passed=False,
-                confidence=0.0,
-                matched_categories=[],
-                missing_categories=request.categories,
-                explanation=f"Failed to extract text from image: {ocr_result.get('error', 'Unknown error')}",
-                ocr_text="",
-                ocr_words=[],
-                details={"error": ocr_result.get("error")},
-            )
+            return ocr_failure_response(request, ocr_result)
 
-        extracted_text = ocr_result["text"]
-        extracted_words = ocr_result["words"]
-        ocr_confidence = ocr_result["confidence"]
+        logger.info(f"OCR extracted {len(ocr_result['words'])} words (confidence: {ocr_result['confidence']:.2f})")
 
-        logger.info(f"OCR extracted {len(extracted_words)} words (confidence: {ocr_confidence:.2f})")
+        # Step 2: Verify locally or with AI
+        logger.info("Step 2: Verifying categories")
+        ai_result = await verify_text(ocr_result, request.categories)
 
-        # Step 2: Verify with AI
-        logger.info("Step 2: Verifying categories with AI")
-        ai_result = verify_with_gemini(
-            ocr_text=extracted_text,
-            categories=request.categories,
-            ocr_words=extracted_words,
-        )
+        return build_verification_response(request, ocr_result, ai_result)
 
-        # Build response
-        passed = ai_result.get("passed", False)
-        confidence = ai_result.get("confidence", 0.0)
-        matched = ai_result.get("matched_categories", [])
-        missing = ai_result.get("missing_categories", request.categories)
-        explanation = ai_result.get("explanation", "No explanation provided")
+    except OCRQueueFull as e:
+        logger.warning(f"Rejecting verification: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error processing verification: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Verification processing failed: {str(e)}")
 
-        logger.info(f"Verification complete: passed={passed}, confidence={confidence:.2f}")
-        logger.info(f"Matched: {matched}, Missing: {missing}")
 
-        return VerificationResponse(
-            passed=passed,
-            confidence=confidence,
-            matched_categories=matched,
-            missing_categories=missing,
-            explanation=explanation,
-            ocr_text=extracted_text,
-            ocr_words=extracted_words,
-            details={
-                "ocr_confidence": ocr_confidence,
-                "word_count": len(extracted_words),
-                "category_analysis": ai_result.get("category_analysis", {}),
-            },
+@app.post("/verify/batch", response_model=List[VerificationResponse], response_model_exclude_none=True)
+async def verify_batch(batch: List[VerificationRequest]):
+    """
+    Verify several receipts in one call. OCR runs concurrently, LLM checks
+    are packed several receipts per prompt for whatever the local matcher
+    cannot settle, and results come back in input
+    order. A failing item is reported in its own response instead of
+    failing the batch.
+    """
+    if len(batch) > cfg.VERIFY_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(batch)} items (max {cfg.VERIFY_BATCH_MAX_ITEMS})",
         )
 
-    except Exception as e:
-        logger.error(f"Error processing verification: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Verification processing failed: {str(e)}")
+    logger.info(f"Processing verification batch of {len(batch)} receipts")
+
+    # Step 1: OCR every receipt, never more at once than the engine has workers
+    slots = asyncio.Semaphore(ocr_engine.workers)
+
+    async def extract(request: VerificationRequest) -> dict:
+        async with slots:
+            try:
+                return await ocr_engine.extract(request.fileUrl, request.categories)
+            except Exception as e:
+                logger.error(f"Batch OCR failed for campaign {request.campaignId}: {str(e)}")
+                return {"success": False, "error": str(e)}
+
+    ocr_results = await asyncio.gather(*[extract(request) for request in batch])
+
+    # Step 2: Settle what the local matcher and classifier can, then pack the rest into LLM calls
+    ai_by_index = {}
+    for i, ocr_result in enumerate(ocr_results):
+        if ocr_result.get("success"):
+            local_result = local_verdict(ocr_result, batch[i].categories)
+            if local_result is not None:
+                ai_by_index[i] = local_result
+
+    pending = [i for i, ocr_result in enumerate(ocr_results) if ocr_result.get("success") and i not in ai_by_index]
+    texts = await asyncio.gather(*[prompt_text(ocr_results[i], batch[i].categories) for i in pending])
+    ai_results = await verify_batch_with_gemini(
+        [(text, batch[i].categories) for i, text in zip(pending, texts)]
+    )
+    ai_by_index.update(zip(pending, ai_results))
 
+    responses = []
+    for i, (request, ocr_result) in enumerate(zip(batch, ocr_results)):
+        if i not in ai_by_index:
+            responses.append(ocr_failure_response(request, ocr_result))
+            continue
+        try:
+            responses.append(build_verification_response(request, ocr_result, ai_by_index[i]))
+        except Exception as e:
+            logger.error(f"Batch item {i} failed: {str(e)}", exc_info=True)
+            responses.append(ocr_failure_response(request, {"error": str(e)}))
 
-@app.post("/verify/stream", response_model=StreamProofResponse)
+    return responses
+
+
+@app.post("/verify/stream", response_model=StreamProofResponse, response_model_exclude_none=True)
 async def verify_stream_proof(request: StreamProofRequest):
     """
     Verify a proof for a specific stream stage.
@@ -173,9 +376,10 @@ async def verify_stream_proof(request: StreamProofRequest):
         logger.info(f"Verifying proof for stream {request.stream_id}, stage {request.stage_index}")
 
         # Extract text via OCR
-        ocr_result = extract_all_text(request.file_url)
+        ocr_result = await ocr_engine.extract(request.file_url, request.expected_categories)
 
         if not ocr_result.get("success"):
+            RECOMMENDATIONS.labels(outcome="REJECT").inc()
             return StreamProofResponse(
                 stream_id=request.stream_id,
                 stage_index=request.stage_index,
@@ -184,20 +388,14 @@ async def verify_stream_proof(request: StreamProofRequest):
                 matched_categories=[],
                 missing_categories=request.expected_categories,
                 explanation=f"OCR failed: {ocr_result.get('error', 'Unknown error')}",
-                ocr_text="",
+                ocr_text=shape_ocr_text("", request.response_shape),
                 recommendation="REJECT - Unable to read proof document",
             )
 
         extracted_text = ocr_result["text"]
-        extracted_words = ocr_result["words"]
-        ocr_confidence = ocr_result["confidence"]
-
-        # Verify with AI
-        ai_result = verify_with_gemini(
-            ocr_text=extracted_text,
-            categories=request.expected_categories,
-            ocr_words=extracted_words,
-        )
+
+        # Verify locally or with AI
+        ai_result = await verify_text(ocr_result, request.expected_categories)
 
         passed = ai_result.get("passed", False)
         confidence = ai_result.get("confidence", 0.0)
@@ -216,6 +414,7 @@ async def verify_stream_proof(request: StreamProofRequest):
             recommendation = "REJECT - Proof does not meet verification criteria."
 
         logger.info(f"Stream proof verification: {recommendation}")
+        RECOMMENDATIONS.labels(outcome=recommendation.split(" - ")[0]).inc()
 
         return StreamProofResponse(
             stream_id=request.stream_id,
@@ -225,15 +424,67 @@ async def verify_stream_proof(request: StreamProofRequest):
             matched_categories=matched,
             missing_categories=missing,
             explanation=explanation,
-            ocr_text=extracted_text,
+            ocr_text=shape_ocr_text(extracted_text, request.response_shape),
             recommendation=recommendation,
         )
 
+    except OCRQueueFull as e:
+        logger.warning(f"Rejecting stream proof verification: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Stream proof verification failed: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Stream proof verification failed: {str(e)}")
 
 
+async def run_verification_job(payload: dict) -> dict:
+    try:
+        response = await verify_categories(VerificationRequest(**payload))
+    except HTTPException as e:
+        if e.status_code == 503:
+            raise RetryJob(e.detail)
+        raise RuntimeError(e.detail)
+    return response.model_dump(exclude_none=True)
+
+
+async def run_stream_proof_job(payload: dict) -> dict:
+    try:
+        response = await verify_stream_proof(StreamProofRequest(**payload))
+    except HTTPException as e:
+        if e.status_code == 503:
+            raise RetryJob(e.detail)
+        raise RuntimeError(e.detail)
+    return response.model_dump(exclude_none=True)
+
+
+@app.post("/jobs/verify", response_model=JobSubmitResponse, status_code=202)
+async def submit_verification_job(request: VerificationJobRequest):
+    """Queue a /verify request and return its job ID immediately."""
+    payload = request.model_dump(exclude={"callbackUrl"})
+    job_id = await asyncio.to_thread(job_queue.submit, "verify", payload, request.callbackUrl)
+    return JobSubmitResponse(job_id=job_id, status="queued")
+
+
+@app.post("/jobs/verify/stream", response_model=JobSubmitResponse, status_code=202)
+async def submit_stream_proof_job(request: StreamProofJobRequest):
+    """Queue a /verify/stream request and return its job ID immediately."""
+    payload = request.model_dump(exclude={"callback_url"})
+    job_id = await asyncio.to_thread(job_queue.submit, "verify_stream", payload, request.callback_url)
+    return JobSubmitResponse(job_id=job_id, status="queued")
+
+
+@app.get("/jobs/stats")
+async def get_job_stats():
+    return await asyncio.to_thread(job_queue.stats)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+
 if __name__ == "__main__":
     import uvicorn
 
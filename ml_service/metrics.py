@@ -0,0 +1,33 @@
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    "ml_stage_seconds",
+    "Time spent in each verification stage",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+OCR_FAILURES = Counter("ml_ocr_failures_total", "OCR extractions that returned no text")
+LLM_PARSE_FALLBACKS = Counter("ml_llm_parse_fallbacks_total", "LLM replies that could not be parsed as a verdict")
+RECOMMENDATIONS = Counter("ml_recommendations_total", "Stream proof recommendations by outcome", ["outcome"])
+
+REQUESTS_IN_FLIGHT = Gauge("ml_requests_in_flight", "HTTP requests currently being handled")
+OCR_IN_FLIGHT = Gauge("ml_ocr_in_flight", "OCR jobs running on worker processes")
+OCR_QUEUED = Gauge("ml_ocr_queued", "OCR jobs waiting for a worker process")
+JOB_QUEUE_DEPTH = Gauge("ml_job_queue_depth", "Verification jobs waiting in the job queue")
+JOB_QUEUE_OLDEST_AGE = Gauge("ml_job_queue_oldest_age_seconds", "Age of the oldest queued verification job")
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Observe the duration of the enclosed block in ml_stage_seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
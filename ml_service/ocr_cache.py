@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import config as cfg
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(data: bytes) -> str:
+    """Cache key for an image: SHA-256 of its bytes plus the OCR language."""
+    return f"{hashlib.sha256(data).hexdigest()}:{cfg.OCR_LANGUAGE}"
+
+
+class OCRCache:
+    """
+    Two-tier cache of extract_all_text results.
+
+    The memory tier is a bounded LRU local to this process. The disk tier
+    is a SQLite database, so results survive restarts and are shared by
+    every uvicorn worker pointing at the same file. Only successful OCR
+    results are stored.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        memory_items: Optional[int] = None,
+        max_rows: Optional[int] = None,
+    ):
+        self.path = path or cfg.OCR_CACHE_PATH
+        self.memory_items = cfg.OCR_CACHE_MEMORY_ITEMS if memory_items is None else memory_items
+        self.max_rows = cfg.OCR_CACHE_MAX_ROWS if max_rows is None else max_rows
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_results ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_ocr_results_created_at ON ocr_results (created_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key: str, result: dict):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+            self.memory_evictions += 1
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return dict(result)
+
+            try:
+                row = self._connect().execute(
+                    "SELECT result FROM ocr_results WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"OCR cache read failed: {e}")
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            result = json.loads(row[0])
+            self._remember(key, result)
+            self.disk_hits += 1
+            return dict(result)
+
+    def put(self, key: str, result: dict):
+        if not result.get("success"):
+            return
+
+        with self._lock:
+            self._remember(key, dict(result))
+            try:
+                conn = self._connect()
+                cursor = conn.execute(
+                    "INSERT OR REPLACE INTO ocr_results (key, result, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(result), time.time()),
+                )
+                # Every write gets a fresh, higher rowid, so keeping the
+                # newest max_rows rows is a range delete on the rowid
+                # rather than a full COUNT(*) scan
+                trimmed = conn.execute(
+                    "DELETE FROM ocr_results WHERE rowid <= ?",
+                    (cursor.lastrowid - self.max_rows,),
+                )
+                self.disk_evictions += trimmed.rowcount
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"OCR cache write failed: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            "memory_items": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_evictions": self.memory_evictions,
+            "disk_evictions": self.disk_evictions,
+        }
+
+
+ocr_cache = OCRCache()
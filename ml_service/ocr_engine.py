@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import config as cfg
+from metrics import OCR_FAILURES, stage_timer
+from ocr_cache import content_key, ocr_cache
+from ocr_extractor import extract_text_from_bytes, get_backend, load_image_bytes, ocr_failure
+
+logger = logging.getLogger(__name__)
+
+
+class OCRQueueFull(Exception):
+    pass
+
+
+def _init_worker():
+    # Runs once in every worker process: pick the OCR backend and, for
+    # tesserocr, load the language model before the first job arrives
+    get_backend()
+
+
+class OCREngine:
+    """
+    Runs OCR jobs in a pool of worker processes so Tesseract never blocks
+    the event loop. At most `workers` jobs run at once and up to
+    `queue_size` more wait for a free worker; anything beyond that is
+    rejected with OCRQueueFull. OCR_TIMEOUT only counts once a job has
+    reached a worker, and a job that times out keeps its slot until the
+    worker process has actually finished it.
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_size: Optional[int] = None):
+        self.workers = max(1, workers or cfg.OCR_WORKERS)
+        self.queue_size = max(0, cfg.OCR_QUEUE_SIZE if queue_size is None else queue_size)
+        self.timeout = cfg.OCR_TIMEOUT
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self._pending = 0
+        self._running = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return self._pending - self._running
+
+    def start(self):
+        if self._executor is None:
+            logger.info(f"Starting OCR engine with {self.workers} workers (queue size {self.queue_size})")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+
+    def _replace_broken(self, executor: ProcessPoolExecutor):
+        # A worker that dies (OOM, Tesseract crash) breaks the whole pool and
+        # every later submit fails; swap in a fresh one unless another job
+        # already has
+        if self._executor is executor:
+            logger.error("OCR worker pool is broken, starting a new one")
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self.start()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, func, *args):
+        """Run `func(*args)` on a worker process and await its result."""
+        if self._pending >= self.workers + self.queue_size:
+            raise OCRQueueFull(f"OCR queue is full ({self.queue_size} waiting)")
+
+        self.start()
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        try:
+            with stage_timer("ocr_queue_wait"):
+                await self._slots.acquire()
+        except BaseException:
+            self._pending -= 1
+            raise
+
+        self._running += 1
+        executor = self._executor
+        try:
+            try:
+                future = loop.run_in_executor(executor, func, *args)
+            except BrokenProcessPool:
+                self._replace_broken(executor)
+                executor = self._executor
+                future = loop.run_in_executor(executor, func, *args)
+        except BaseException:
+            self._running -= 1
+            self._pending -= 1
+            self._slots.release()
+            raise
+        future.add_done_callback(self._release)
+
+        # asyncio.wait leaves the job running on timeout; its slot is only
+        # freed by _release once the worker is done with it
+        with stage_timer("ocr"):
+            done, _ = await asyncio.wait({future}, timeout=self.timeout)
+        if not done:
+            raise asyncio.TimeoutError()
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            self._replace_broken(executor)
+            raise
+
+    def _release(self, future: asyncio.Future):
+        if not future.cancelled():
+            # Mark the exception retrieved for jobs whose caller gave up
+            future.exception()
+        self._running -= 1
+        self._pending -= 1
+        self._slots.release()
+
+    async def extract(self, file_url: str, categories: Optional[list] = None) -> dict:
+        """
+        Async counterpart of ocr_extractor.extract_all_text.
+
+        The image is loaded on a thread, looked up in the OCR cache by
+        content hash and only sent to a worker process on a miss. The
+        result carries a `cached` flag. `categories` lets multi-page PDFs
+        stop early once every category has evidence; such partial results
+        are not cached.
+        """
+        logger.info(f"Loading image from: {file_url}")
+        try:
+            with stage_timer("image_load"):
+                data = await asyncio.to_thread(load_image_bytes, file_url)
+        except Exception as e:
+            OCR_FAILURES.inc()
+            return {**ocr_failure(e), "cached": False}
+
+        key = None
+        if cfg.OCR_CACHE_ENABLED:
+            key = content_key(data)
+            # The cache's disk tier is SQLite; keep its I/O off the event loop
+            cached = await asyncio.to_thread(ocr_cache.get, key)
+            if cached is not None:
+                logger.info(f"OCR cache hit for {file_url}")
+                return {**cached, "cached": True}
+
+        try:
+            result = await self.run(extract_text_from_bytes, data, categories)
+        except asyncio.TimeoutError:
+            logger.error(f"OCR timed out after {self.timeout}s: {file_url}")
+            OCR_FAILURES.inc()
+            return {**ocr_failure(f"OCR timed out after {self.timeout}s"), "cached": False}
+        except BrokenProcessPool as e:
+            logger.error(f"OCR worker died while processing {file_url}: {e}")
+            OCR_FAILURES.inc()
+            return {**ocr_failure(f"OCR worker died: {e}"), "cached": False}
+
+        if not result.get("success"):
+            OCR_FAILURES.inc()
+
+        if key is not None and not result.get("early_exit"):
+            await asyncio.to_thread(ocr_cache.put, key, result)
+        return {**result, "cached": False}
+
+    def stats(self) -> dict:
+        return {
+            "backend": cfg.OCR_BACKEND,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+        }
+
+
+ocr_engine = OCREngine()
@@ -1,69 +1,478 @@
+import pypdfium2 as pdfium
 import pytesseract
-from PIL import Image
+from PIL import Image, ImageOps
 import requests
 from io import BytesIO
 import logging
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import config as cfg
+from category_matcher import category_matcher
 
 logger = logging.getLogger(__name__)
 
-def download_image(file_url: str) -> Image.Image:
+WORD_LEVEL = 5
+CHUNK_SIZE = 64 * 1024
+PDF_MAGIC = b'%PDF-'
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+class PytesseractBackend:
+    """Runs the tesseract CLI through pytesseract, one process per call."""
+
+    name = "pytesseract"
+
+    def __init__(self):
+        if cfg.TESSERACT_CMD:
+            pytesseract.pytesseract.tesseract_cmd = cfg.TESSERACT_CMD
+
+    def image_to_data(self, image: Image.Image) -> dict:
+        return pytesseract.image_to_data(
+            image, lang=cfg.OCR_LANGUAGE, output_type=pytesseract.Output.DICT
+        )
+
+    def image_to_string(self, image: Image.Image) -> str:
+        return pytesseract.image_to_string(image, lang=cfg.OCR_LANGUAGE)
+
+
+class TesserocrBackend:
+    """
+    Keeps Tesseract loaded in-process through tesserocr. Images are handed
+    over in memory, and language data is only read when an API instance is
+    created. Instances are not thread-safe, so each call borrows one from a
+    pool that grows to the number of concurrent callers (strip threads).
+    """
+
+    name = "tesserocr"
+
+    def __init__(self):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self._apis = queue.SimpleQueue()
+        # Load the language model now rather than on the first request
+        self._release(self._acquire())
+
+    def _acquire(self):
+        try:
+            return self._apis.get_nowait()
+        except queue.Empty:
+            kwargs = {"lang": cfg.OCR_LANGUAGE}
+            if cfg.TESSDATA_PATH:
+                kwargs["path"] = cfg.TESSDATA_PATH
+            return self._tesserocr.PyTessBaseAPI(**kwargs)
+
+    def _release(self, api):
+        api.Clear()
+        self._apis.put(api)
+
+    def image_to_data(self, image: Image.Image) -> dict:
+        """Word boxes in the same shape as pytesseract's image_to_data DICT."""
+        RIL = self._tesserocr.RIL
+        ocr_data = {key: [] for key in (
+            'level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+            'left', 'top', 'width', 'height', 'conf', 'text',
+        )}
+        api = self._acquire()
+        try:
+            api.SetImage(image)
+            api.Recognize()
+            iterator = api.GetIterator()
+            block = par = line = word = 0
+            if iterator is not None and not iterator.Empty(RIL.WORD):
+                while True:
+                    if iterator.IsAtBeginningOf(RIL.BLOCK):
+                        block, par, line, word = block + 1, 0, 0, 0
+                    if iterator.IsAtBeginningOf(RIL.PARA):
+                        par, line, word = par + 1, 0, 0
+                    if iterator.IsAtBeginningOf(RIL.TEXTLINE):
+                        line, word = line + 1, 0
+                    word += 1
+
+                    box = iterator.BoundingBox(RIL.WORD)
+                    text = iterator.GetUTF8Text(RIL.WORD) or ''
+                    if box is not None:
+                        left, top, right, bottom = box
+                        for key, value in (
+                            ('level', WORD_LEVEL), ('page_num', 1), ('block_num', block),
+                            ('par_num', par), ('line_num', line), ('word_num', word),
+                            ('left', left), ('top', top), ('width', right - left),
+                            ('height', bottom - top), ('conf', iterator.Confidence(RIL.WORD)),
+                            ('text', text),
+                        ):
+                            ocr_data[key].append(value)
+
+                    if not iterator.Next(RIL.WORD):
+                        break
+        finally:
+            self._release(api)
+        return ocr_data
+
+    def image_to_string(self, image: Image.Image) -> str:
+        api = self._acquire()
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            self._release(api)
+
+
+_backend = None
+
+
+def get_backend():
+    """The OCR backend for this process, created on first use."""
+    global _backend
+    if _backend is None:
+        if cfg.OCR_BACKEND in ("auto", "tesserocr"):
+            try:
+                _backend = TesserocrBackend()
+            except Exception as e:
+                if cfg.OCR_BACKEND == "tesserocr":
+                    logger.warning(f"tesserocr backend unavailable, falling back to pytesseract: {e}")
+        if _backend is None:
+            _backend = PytesseractBackend()
+        logger.info(f"Using {_backend.name} OCR backend (lang={cfg.OCR_LANGUAGE})")
+    return _backend
+
+
+def _check_size(size: int):
+    if size > cfg.MAX_IMAGE_SIZE:
+        raise ImageTooLarge(f"Image exceeds maximum size of {cfg.MAX_IMAGE_SIZE} bytes")
+
+
+def _stream_download(file_url: str) -> bytes:
+    with requests.get(file_url, timeout=cfg.REQUEST_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit():
+            _check_size(int(content_length))
+
+        buffer = bytearray()
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            buffer.extend(chunk)
+            _check_size(len(buffer))
+        return bytes(buffer)
+
+
+def load_image_bytes(file_url: str) -> bytes:
     try:
         if file_url.startswith('http://') or file_url.startswith('https://'):
-            response = requests.get(file_url, timeout=30)
-            response.raise_for_status()
-            image = Image.open(BytesIO(response.content))
-        else:
-            image = Image.open(file_url)
-        return image
+            return _stream_download(file_url)
+        _check_size(os.path.getsize(file_url))
+        with open(file_url, 'rb') as f:
+            return f.read()
     except Exception as e:
         logger.error(f"Failed to load image: {str(e)}")
         raise
 
 
-def extract_all_text(file_url: str) -> dict:
+def download_image(file_url: str) -> Image.Image:
+    return Image.open(BytesIO(load_image_bytes(file_url)))
+
+
+def preprocess_image(image: Image.Image) -> Image.Image:
+    """
+    Normalize an image for Tesseract: apply the EXIF orientation, convert
+    to grayscale, downscale to OCR_TARGET_DPI / OCR_MAX_PIXELS and
+    optionally binarize. OCR time grows with pixel count, so large phone
+    photos are shrunk before they reach Tesseract.
+    """
+    image = ImageOps.exif_transpose(image)
+    image = image.convert('L')
+
+    scale = 1.0
+    dpi = image.info.get('dpi')
+    if dpi and dpi[0] and dpi[0] > cfg.OCR_TARGET_DPI:
+        scale = cfg.OCR_TARGET_DPI / float(dpi[0])
+    pixels = image.width * image.height * scale * scale
+    if pixels > cfg.OCR_MAX_PIXELS:
+        scale *= (cfg.OCR_MAX_PIXELS / pixels) ** 0.5
+
+    if scale < 1.0:
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        logger.debug(f"Downscaling image from {image.size} to {size}")
+        image = image.resize(size, Image.LANCZOS)
+
+    if cfg.OCR_BINARIZE:
+        threshold = cfg.OCR_BINARIZE_THRESHOLD
+        image = ImageOps.autocontrast(image).point(lambda p: 255 if p > threshold else 0)
+
+    return image
+
+
+def text_from_data(ocr_data: dict) -> str:
+    """
+    Rebuild Tesseract's plain-text output from image_to_data results.
+
+    Mirrors the layout image_to_string produces: words joined by spaces,
+    one line per text line, a blank line after every paragraph and a
+    trailing form feed for the page.
+    """
+    paragraphs = []
+    current_par = None
+    current_line = None
+
+    for i, word in enumerate(ocr_data['text']):
+        if int(ocr_data['level'][i]) != WORD_LEVEL or not word.strip():
+            continue
+
+        par_key = (ocr_data['page_num'][i], ocr_data['block_num'][i], ocr_data['par_num'][i])
+        line_key = par_key + (ocr_data['line_num'][i],)
+
+        if par_key != current_par:
+            paragraphs.append([])
+            current_par = par_key
+            current_line = None
+        if line_key != current_line:
+            paragraphs[-1].append([])
+            current_line = line_key
+        paragraphs[-1][-1].append(word.strip())
+
+    text = "".join(
+        "".join(" ".join(line) + "\n" for line in lines) + "\n"
+        for lines in paragraphs
+    )
+    return text + "\f"
+
+
+def find_strip_cuts(image: Image.Image, strips: int) -> list:
+    """
+    Row offsets that split the image into `strips` bands, each cut moved to
+    the nearest blank row so text lines are not sliced in half.
+    """
+    gray = image.convert('L')
+    width, height = gray.size
+    pixels = gray.tobytes()
+
+    # A row is blank when (almost) none of its pixels are dark
+    max_ink = max(1, width // 200)
+    blank = [
+        sum(1 for p in pixels[y * width:(y + 1) * width] if p < 128) <= max_ink
+        for y in range(height)
+    ]
+
+    step = height / strips
+    search = int(step / 4)
+    cuts = [0]
+    for i in range(1, strips):
+        target = int(step * i)
+        cut = target
+        for delta in range(search):
+            if blank[min(height - 1, target + delta)]:
+                cut = target + delta
+                break
+            if blank[max(0, target - delta)]:
+                cut = target - delta
+                break
+        cuts.append(max(cuts[-1] + 1, cut))
+    cuts.append(height)
+    return cuts
+
+
+def merge_strip_data(strip_results: list, cuts: list, overlaps: list) -> dict:
+    """
+    Stitch per-strip image_to_data results into one result in reading
+    order. Each strip only contributes the words whose vertical centre
+    falls inside its own band, which removes the duplicates read twice in
+    the overlaps. Block numbers are offset per strip so text_from_data
+    keeps every strip's paragraphs and lines apart.
+    """
+    merged = {}
+    for index, (ocr_data, top) in enumerate(zip(strip_results, overlaps)):
+        band_start, band_end = cuts[index], cuts[index + 1]
+        for i in range(len(ocr_data['text'])):
+            centre = top + int(ocr_data['top'][i]) + int(ocr_data['height'][i]) / 2
+            if not band_start <= centre < band_end:
+                continue
+            for key, values in ocr_data.items():
+                value = values[i]
+                if key == 'top':
+                    value = int(value) + top
+                elif key == 'block_num':
+                    value = int(value) + index * 1000
+                merged.setdefault(key, []).append(value)
+    return merged
+
+
+def run_ocr_strips(image: Image.Image) -> dict:
+    """image_to_data for a tall image, OCR'd as overlapping strips in parallel."""
+    strips = max(2, min(cfg.OCR_STRIP_WORKERS, image.height // cfg.OCR_STRIP_MIN_HEIGHT))
+    cuts = find_strip_cuts(image, strips)
+    tops = [max(0, cuts[i] - cfg.OCR_STRIP_OVERLAP) for i in range(strips)]
+    crops = [
+        image.crop((0, tops[i], image.width, min(image.height, cuts[i + 1] + cfg.OCR_STRIP_OVERLAP)))
+        for i in range(strips)
+    ]
+    logger.info(f"OCR on {strips} strips of a {image.width}x{image.height} image")
+
+    # Both backends release the GIL while Tesseract runs, so threads run in parallel
+    with ThreadPoolExecutor(max_workers=strips) as executor:
+        strip_results = list(executor.map(get_backend().image_to_data, crops))
+
+    return merge_strip_data(strip_results, cuts, tops)
+
+
+def is_tall(image: Image.Image) -> bool:
+    return (
+        image.height >= image.width * cfg.OCR_TALL_RATIO
+        and image.height >= 2 * cfg.OCR_STRIP_MIN_HEIGHT
+    )
+
+
+def run_ocr(image: Image.Image, single_pass: bool = None) -> tuple:
+    """Run Tesseract on an image and return (text, ocr_data)."""
+    if single_pass is None:
+        single_pass = cfg.OCR_SINGLE_PASS
+
+    if cfg.OCR_STRIPS_ENABLED and cfg.OCR_STRIP_WORKERS > 1 and is_tall(image):
+        # Strips are always stitched at word level, so the text is rebuilt from the data
+        ocr_data = run_ocr_strips(image)
+        return text_from_data(ocr_data), ocr_data
+
+    backend = get_backend()
+
+    # Get detailed OCR data with confidence scores
+    ocr_data = backend.image_to_data(image)
+
+    if single_pass:
+        text = text_from_data(ocr_data)
+    else:
+        text = backend.image_to_string(image)
+
+    return text, ocr_data
+
+
+def extract_all_text(file_url: str, categories: list = None) -> dict:
     try:
         # Download/load image
         logger.info(f"Loading image from: {file_url}")
-        image = download_image(file_url)
+        data = load_image_bytes(file_url)
+    except Exception as e:
+        return ocr_failure(e)
+
+    return extract_text_from_bytes(data, categories)
+
+
+def extract_text_from_bytes(data: bytes, categories: list = None) -> dict:
+    try:
+        if data.startswith(PDF_MAGIC):
+            return extract_text_from_pdf(data, categories)
+
+        image = Image.open(BytesIO(data))
+        if cfg.OCR_PREPROCESS:
+            image = preprocess_image(image)
 
         # Perform OCR - extract all text
         logger.info("Performing OCR extraction")
-        text = pytesseract.image_to_string(image)
+        text, ocr_data = run_ocr(image)
+        words, confidences = words_and_confidences(ocr_data)
 
-        # Get detailed OCR data with confidence scores
-        ocr_data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+        return ocr_result(text, words, confidences)
 
-        # Extract words and their confidences
-        words = []
-        confidences = []
+    except Exception as e:
+        return ocr_failure(e)
 
-        for i, word in enumerate(ocr_data['text']):
-            conf = int(ocr_data['conf'][i])
-            if conf > 0 and word.strip():  # Only valid words with confidence
-                words.append(word.strip())
-                confidences.append(conf)
 
-        # Calculate average confidence
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+def iter_pdf_pages(data: bytes, dpi: int):
+    """
+    Yield the pages of a PDF as PIL images, rendering each one only when
+    the previous one has been consumed so memory stays flat.
+    """
+    pdf = pdfium.PdfDocument(data)
+    try:
+        page_count = min(len(pdf), cfg.OCR_PDF_MAX_PAGES)
+        for index in range(page_count):
+            page = pdf[index]
+            bitmap = page.render(scale=dpi / 72)
+            try:
+                yield bitmap.to_pil()
+            finally:
+                bitmap.close()
+                page.close()
+    finally:
+        pdf.close()
 
-        logger.info(f"OCR extracted {len(words)} words with avg confidence {avg_confidence:.1f}%")
-        logger.debug(f"Extracted text: {text[:200]}...")  # Log first 200 chars
 
-        return {
-            "success": True,
-            "confidence": avg_confidence / 100.0,  # Normalize to 0-1
-            "text": text,
-            "words": words,
-            "word_count": len(words)
-        }
+def extract_text_from_pdf(data: bytes, categories: list = None) -> dict:
+    """
+    OCR a PDF page by page. With OCR_PDF_EARLY_EXIT, the local matcher
+    enabled and a category list, stops as soon as the matcher finds
+    evidence for every category.
+    """
+    early_exit_enabled = cfg.OCR_PDF_EARLY_EXIT and cfg.LOCAL_MATCHER_ENABLED and bool(categories)
+    texts = []
+    words = []
+    confidences = []
+    early_exit = False
 
-    except Exception as e:
-        logger.error(f"OCR extraction failed: {str(e)}")
-        return {
-            "success": False,
-            "confidence": 0.0,
-            "text": "",
-            "words": [],
-            "word_count": 0,
-            "error": str(e)
-        }
+    for page_number, image in enumerate(iter_pdf_pages(data, cfg.OCR_PDF_DPI), 1):
+        if cfg.OCR_PREPROCESS:
+            image = preprocess_image(image)
+
+        logger.info(f"Performing OCR extraction on PDF page {page_number}")
+        text, ocr_data = run_ocr(image)
+        page_words, page_confidences = words_and_confidences(ocr_data)
+
+        texts.append(text)
+        words.extend(page_words)
+        confidences.extend(page_confidences)
+
+        if early_exit_enabled and category_matcher.match(words, categories) is not None:
+            logger.info(f"All categories found by page {page_number}, skipping remaining pages")
+            early_exit = True
+            break
+
+    if not texts:
+        raise ValueError("PDF has no pages")
+
+    return ocr_result("".join(texts), words, confidences, pages=len(texts), early_exit=early_exit)
+
+
+def words_and_confidences(ocr_data: dict) -> tuple:
+    # Extract words and their confidences
+    words = []
+    confidences = []
+
+    for i, word in enumerate(ocr_data['text']):
+        conf = int(float(ocr_data['conf'][i]))
+        if conf > 0 and word.strip():  # Only valid words with confidence
+            words.append(word.strip())
+            confidences.append(conf)
+
+    return words, confidences
+
+
+def ocr_result(text: str, words: list, confidences: list, **extra) -> dict:
+    # Calculate average confidence
+    avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+
+    logger.info(f"OCR extracted {len(words)} words with avg confidence {avg_confidence:.1f}%")
+    logger.debug(f"Extracted text: {text[:200]}...")  # Log first 200 chars
+
+    return {
+        "success": True,
+        "confidence": avg_confidence / 100.0,  # Normalize to 0-1
+        "text": text,
+        "words": words,
+        "confidences": confidences,
+        "word_count": len(words),
+        **extra
+    }
+
+
+def ocr_failure(error) -> dict:
+    logger.error(f"OCR extraction failed: {str(error)}")
+    return {
+        "success": False,
+        "confidence": 0.0,
+        "text": "",
+        "words": [],
+        "word_count": 0,
+        "error": str(error)
+    }
@@ -0,0 +1,138 @@
+import re
+from typing import List, Optional
+
+import config as cfg
+from category_matcher import category_matcher, normalize_token
+
+# Rough size of an LLM token in characters for English receipt text
+CHARS_PER_TOKEN = 4
+
+DIGIT_RUN_RE = re.compile(r"\d{13,}")
+MONEY_RE = re.compile(r"\d+[.,]\d{2}\b")
+GAP_MARKER = "[...]"
+# How far ahead in the word list to look for a token after a mismatch
+ALIGN_WINDOW = 8
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _shorten_digit_run(match: re.Match) -> str:
+    # Card numbers, barcodes and reference ids carry no category evidence
+    run = match.group(0)
+    return f"{run[:4]}…{run[-4:]}"
+
+
+def drop_low_confidence(text: str, words: list, confidences: list, threshold: int) -> List[List[str]]:
+    """
+    Split OCR text into lines of tokens, dropping tokens whose OCR
+    confidence is below `threshold`. Tokens are aligned with the word list
+    in reading order, resyncing within ALIGN_WINDOW words after a
+    mismatch (the text and word list can come from different OCR passes).
+    Tokens that cannot be aligned are kept.
+    """
+    lines = []
+    position = 0
+    for raw_line in text.splitlines():
+        kept = []
+        for token in raw_line.split():
+            match = None
+            for candidate in range(position, min(position + ALIGN_WINDOW, len(words))):
+                if token == words[candidate]:
+                    match = candidate
+                    break
+            if match is None:
+                kept.append(token)
+                continue
+            position = match + 1
+            if confidences[match] >= threshold:
+                kept.append(token)
+        lines.append(kept)
+    return lines
+
+
+def _priority_lines(lines: List[str], categories: list) -> List[int]:
+    """Line indices in the order they should survive truncation."""
+    head = list(range(min(5, len(lines))))
+    tail = list(range(max(0, len(lines) - 5), len(lines)))
+    # Literal synonym hits only: fuzzy matching is far slower and scores
+    # below LOCAL_MATCH_MIN_CONFIDENCE anyway
+    evidence_words = set().union(*(category_matcher.evidence_words(category) for category in categories))
+    evidence = [
+        i for i, line in enumerate(lines)
+        if not evidence_words.isdisjoint(normalize_token(token) for token in line.split())
+    ]
+    money = [i for i, line in enumerate(lines) if MONEY_RE.search(line)]
+
+    order = []
+    seen = set()
+    for i in head + tail + evidence + money + list(range(len(lines))):
+        if i not in seen:
+            seen.add(i)
+            order.append(i)
+    return order
+
+
+def truncate_to_budget(lines: List[str], categories: list, max_tokens: int) -> List[str]:
+    """
+    Keep the lines most useful to the verifier within `max_tokens`: the
+    header and footer (merchant, totals), lines with category evidence,
+    lines with amounts, then everything else top-down. Lines keep their
+    original order and skipped stretches become a single marker line.
+    """
+    budget = max_tokens * CHARS_PER_TOKEN
+    if sum(len(line) + 1 for line in lines) <= budget:
+        return lines
+    # Leave room for the gap markers
+    budget -= 10 * (len(GAP_MARKER) + 1)
+
+    kept = set()
+    used = 0
+    for i in _priority_lines(lines, categories):
+        cost = len(lines[i]) + 1
+        if used + cost > budget:
+            continue
+        kept.add(i)
+        used += cost
+
+    result = []
+    for i, line in enumerate(lines):
+        if i in kept:
+            result.append(line)
+        elif not result or result[-1] != GAP_MARKER:
+            result.append(GAP_MARKER)
+    return result
+
+
+def compact_ocr_text(
+    text: str,
+    categories: list,
+    words: Optional[list] = None,
+    confidences: Optional[list] = None,
+    max_tokens: Optional[int] = None,
+) -> str:
+    """
+    Shrink OCR output before prompting: drop low-confidence words, collapse
+    whitespace and blank lines, shorten long digit runs, remove repeated
+    lines and enforce the PROMPT_MAX_TOKENS budget.
+    """
+    if max_tokens is None:
+        max_tokens = cfg.PROMPT_MAX_TOKENS
+
+    if words and confidences and len(words) == len(confidences):
+        token_lines = drop_low_confidence(text, words, confidences, cfg.PROMPT_MIN_WORD_CONFIDENCE)
+    else:
+        token_lines = [line.split() for line in text.splitlines()]
+
+    lines = []
+    seen = set()
+    for tokens in token_lines:
+        line = DIGIT_RUN_RE.sub(_shorten_digit_run, " ".join(tokens))
+        key = line.casefold()
+        if not line or key in seen:
+            continue
+        seen.add(key)
+        lines.append(line)
+
+    return "\n".join(truncate_to_budget(lines, categories, max_tokens))
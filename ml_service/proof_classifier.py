@@ -0,0 +1,152 @@
+import json
+import logging
+import math
+import os
+import re
+import zlib
+from typing import List, Optional
+
+import numpy as np
+
+import config as cfg
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 2 ** 18
+TOKEN_RE = re.compile(r"[a-z][a-z0-9]+|\d+[.,]\d{2}")
+
+WEIGHTS_FILE = "weights.npy"
+IDF_FILE = "idf.npy"
+META_FILE = "meta.json"
+
+
+def features(text: str, n_features: int = N_FEATURES) -> tuple:
+    """
+    Hashed bag of words and bigrams, returned as (indices, counts). CRC32
+    keeps the hashing stable between the training run and the service.
+    """
+    tokens = TOKEN_RE.findall(text.lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    counts = {}
+    for gram in grams:
+        index = zlib.crc32(gram.encode("utf-8")) % n_features
+        counts[index] = counts.get(index, 0) + 1
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return indices, values
+
+
+def tfidf(indices: np.ndarray, counts: np.ndarray, idf: np.ndarray) -> np.ndarray:
+    values = (1.0 + np.log(counts)) * idf[indices]
+    norm = float(np.linalg.norm(values))
+    return values / norm if norm else values
+
+
+def train(texts: List[str], labels: List[int], epochs: int = 300, learning_rate: float = 5.0,
+          l2: float = 1e-4, n_features: int = N_FEATURES) -> tuple:
+    """Fit TF-IDF + logistic regression. Returns (weights, idf, bias)."""
+    docs = [features(text, n_features) for text in texts]
+    y = np.asarray(labels, dtype=np.float32)
+
+    document_frequency = np.zeros(n_features, dtype=np.float32)
+    for indices, _ in docs:
+        document_frequency[indices] += 1
+    idf = (np.log((1 + len(docs)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+    rows = [(indices, tfidf(indices, counts, idf)) for indices, counts in docs]
+    weights = np.zeros(n_features, dtype=np.float32)
+    bias = 0.0
+
+    for _ in range(epochs):
+        gradient = l2 * weights
+        bias_gradient = 0.0
+        for (indices, values), label in zip(rows, y):
+            p = 1.0 / (1.0 + math.exp(-(float(weights[indices] @ values) + bias)))
+            error = (p - label) / len(rows)
+            np.add.at(gradient, indices, error * values)
+            bias_gradient += error
+        weights -= learning_rate * gradient
+        bias -= learning_rate * bias_gradient
+
+    return weights, idf, float(bias)
+
+
+def save(path: str, weights: np.ndarray, idf: np.ndarray, bias: float, meta: Optional[dict] = None):
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, WEIGHTS_FILE), weights.astype(np.float32))
+    np.save(os.path.join(path, IDF_FILE), idf.astype(np.float32))
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump({"bias": float(bias), "n_features": int(weights.shape[0]), **(meta or {})}, f, indent=2)
+
+
+class ProofClassifier:
+    """
+    Scores OCR text with a model trained on past proof verdicts. Weights
+    are memory-mapped, so loading is near-instant and the pages are shared
+    between processes.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path if path is not None else cfg.CLASSIFIER_PATH
+        self.weights: Optional[np.ndarray] = None
+        self.idf: Optional[np.ndarray] = None
+        self.bias = 0.0
+        self.meta = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self.weights is not None
+
+    def load(self) -> bool:
+        if self.loaded:
+            return True
+        if not self.path or not os.path.exists(os.path.join(self.path, META_FILE)):
+            return False
+        try:
+            with open(os.path.join(self.path, META_FILE)) as f:
+                self.meta = json.load(f)
+            self.weights = np.load(os.path.join(self.path, WEIGHTS_FILE), mmap_mode="r")
+            self.idf = np.load(os.path.join(self.path, IDF_FILE), mmap_mode="r")
+            self.bias = float(self.meta["bias"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Failed to load proof classifier from {self.path}: {e}")
+            self.weights = self.idf = None
+            return False
+        logger.info(f"Loaded proof classifier from {self.path} ({self.meta.get('samples', '?')} training samples)")
+        return True
+
+    def score(self, text: str) -> float:
+        """Probability that a proof with this OCR text would be verified."""
+        indices, counts = features(text, self.weights.shape[0])
+        if not len(indices):
+            return 0.5
+        z = float(self.weights[indices] @ tfidf(indices, counts, self.idf)) + self.bias
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def classify(self, text: str, categories: list) -> Optional[dict]:
+        """
+        A verify_with_gemini-shaped rejection for receipts that look like
+        previously rejected proofs, or None to let the LLM decide. The
+        model does not see the campaign's categories, so it never accepts
+        a receipt on its own.
+        """
+        if not self.loaded:
+            return None
+
+        probability = self.score(text)
+        if probability > cfg.CLASSIFIER_REJECT_THRESHOLD:
+            return None
+
+        logger.info(f"Proof classifier rejected receipt (p={probability:.3f})")
+        return {
+            "passed": False,
+            "confidence": 1.0 - probability,
+            "matched_categories": [],
+            "missing_categories": list(categories),
+            "explanation": "Receipt closely matches previously rejected proofs",
+            "category_analysis": {},
+            "decided_by": "classifier",
+        }
+
+
+proof_classifier = ProofClassifier()
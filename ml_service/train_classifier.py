@@ -0,0 +1,129 @@
+"""
+Train the proof pre-classifier from historical verdicts.
+
+Reads the ML service's verdicts on past proofs from the backend database
+(skipping outages and releases the stream blocked), OCRs each
+proof's file (reusing the OCR cache when the image was seen before), fits
+TF-IDF + logistic regression and writes the artifact ProofClassifier
+loads at startup.
+
+Usage (from ml_service/):
+    python train_classifier.py [--db ../server/charitable.db] [--output proof_classifier]
+"""
+import argparse
+import logging
+import random
+import sqlite3
+import time
+
+import config as cfg
+from ocr_cache import content_key, ocr_cache
+from ocr_extractor import extract_text_from_bytes, load_image_bytes
+from proof_classifier import ProofClassifier, save, train
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+LABELS = {"verified": 1, "rejected": 0}
+
+# Rejections the ML service did not make: outages, and (before proofs
+# recorded ml_verified) verified receipts whose stream blocked the release
+NON_ML_REJECTION_PREFIX = "ML service"
+BLOCKED_RELEASE_SUFFIX = "no stage was released"
+
+
+def proof_label(status: str, ml_verified, ml_explanation: str):
+    """The ML service's verdict on a proof as a training label, or None if it gave none."""
+    if ml_verified is not None:
+        return int(bool(ml_verified))
+    status = (status or "").lower()
+    if status not in LABELS:
+        return None
+    explanation = ml_explanation or ""
+    if status == "rejected" and (
+        explanation.startswith(NON_ML_REJECTION_PREFIX) or explanation.endswith(BLOCKED_RELEASE_SUFFIX)
+    ):
+        return None
+    return LABELS[status]
+
+
+def load_proofs(db_path: str) -> list:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(proofs)")}
+        ml_verified = "ml_verified" if "ml_verified" in columns else "NULL"
+        rows = conn.execute(f"SELECT id, file_url, status, {ml_verified}, ml_explanation FROM proofs").fetchall()
+    finally:
+        conn.close()
+    proofs = []
+    for proof_id, file_url, status, verified, explanation in rows:
+        label = proof_label(status, verified, explanation)
+        if label is not None:
+            proofs.append((proof_id, file_url, label))
+    return proofs
+
+
+def proof_text(file_url: str) -> str:
+    data = load_image_bytes(file_url)
+    key = content_key(data)
+    result = ocr_cache.get(key) if cfg.OCR_CACHE_ENABLED else None
+    if result is None:
+        result = extract_text_from_bytes(data)
+        if cfg.OCR_CACHE_ENABLED:
+            ocr_cache.put(key, result)
+    if not result["success"]:
+        raise ValueError(result.get("error", "OCR failed"))
+    return result["text"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the proof pre-classifier")
+    parser.add_argument("--db", default="../server/charitable.db")
+    parser.add_argument("--output", default=cfg.CLASSIFIER_PATH)
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of proofs kept for evaluation")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the train/holdout shuffle")
+    args = parser.parse_args()
+
+    texts, labels = [], []
+    for proof_id, file_url, label in load_proofs(args.db):
+        try:
+            texts.append(proof_text(file_url))
+            labels.append(label)
+        except Exception as e:
+            print(f"skipping proof {proof_id}: {e}")
+
+    if len(set(labels)) < 2:
+        raise SystemExit(f"Need both verified and rejected proofs to train, got {len(labels)} usable proofs")
+
+    # Proofs come back in insertion order; shuffle so the holdout is not just the newest ones
+    samples = list(zip(texts, labels))
+    random.Random(args.seed).shuffle(samples)
+    texts = [text for text, _ in samples]
+    labels = [label for _, label in samples]
+
+    split = int(len(texts) * (1 - args.holdout))
+    start = time.perf_counter()
+    weights, idf, bias = train(texts[:split], labels[:split], epochs=args.epochs)
+    print(f"trained on {split} proofs in {time.perf_counter() - start:.1f}s")
+
+    save(args.output, weights, idf, bias, meta={"samples": split, "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+
+    classifier = ProofClassifier(args.output)
+    classifier.load()
+    held_out = list(zip(texts[split:], labels[split:]))
+    if held_out:
+        decided = correct = 0
+        for text, label in held_out:
+            verdict = classifier.classify(text, [])
+            if verdict is not None:
+                decided += 1
+                correct += int(not label)
+        print(f"held-out: {len(held_out)} proofs, {decided} rejected without the LLM, "
+              f"{correct}/{decided} correct" if decided else f"held-out: {len(held_out)} proofs, none decided")
+
+    print(f"model written to {args.output}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import config as cfg
+
+
+def verdict_key(ocr_text: str, categories: list) -> str:
+    """
+    Cache key for an LLM verdict: the OCR text with case and whitespace
+    folded, the sorted category list and the model that produced it.
+    """
+    normalized_text = " ".join(ocr_text.casefold().split())
+    payload = "\x00".join([cfg.OPENROUTER_MODEL, normalized_text, *sorted(categories)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """In-memory LRU of verify_with_gemini results with a per-entry TTL."""
+
+    def __init__(self, ttl: Optional[int] = None, max_items: Optional[int] = None):
+        self.ttl = cfg.VERDICT_CACHE_TTL if ttl is None else ttl
+        self.max_items = cfg.VERDICT_CACHE_MAX_ITEMS if max_items is None else max_items
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(result)
+
+    def put(self, key: str, result: dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "items": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+verdict_cache = VerdictCache()
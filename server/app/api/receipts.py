@@ -1,32 +1,191 @@
-import uuid
+import hashlib
+import os
+import tempfile
 from pathlib import Path
+from typing import List, Optional
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+try:
+    from python_multipart.exceptions import ParseError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    from multipart.exceptions import ParseError
+    from multipart.multipart import MultipartParser, parse_options_header
 
 router = APIRouter()
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
 UPLOAD_DIR = BASE_DIR / "uploads" / "receipts"
 ALLOWED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg"}
+FILE_FIELD = "file"
+# Allowance for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 16 * 1024
+
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {FILE_FIELD: {"type": "string", "format": "binary"}},
+                    "required": [FILE_FIELD],
+                }
+            }
+        },
+    }
+}
+
+
+def find_receipt(digest: str):
+    """Return the stored receipt with this content hash, if any."""
+    for extension in ALLOWED_EXTENSIONS:
+        path = UPLOAD_DIR / f"{digest}{extension}"
+        if path.exists():
+            return path
+    return None
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Receipt exceeds maximum size of {settings.RECEIPT_MAX_UPLOAD_BYTES} bytes",
+    )
+
+
+class ReceiptPart:
+    """
+    MultipartParser callbacks that pick out the receipt file part. The
+    callbacks are synchronous, so file data is collected in `chunks` and
+    written by the endpoint between reads of the request body.
+    """
+
+    def __init__(self):
+        self.filename: Optional[str] = None
+        self.chunks: List[bytes] = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._in_file = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
 
+    def on_part_begin(self):
+        self._disposition = b""
 
-@router.post("/upload")
-async def upload_receipt(file: UploadFile = File(...)):
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="Missing receipt filename")
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
 
-    extension = Path(file.filename).suffix.lower()
-    if extension not in ALLOWED_EXTENSIONS:
-        raise HTTPException(status_code=400, detail="Unsupported receipt file type")
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        # Only the first file part is the receipt; other fields are ignored
+        if self.filename is None and options.get(b"name") == FILE_FIELD.encode() and b"filename" in options:
+            self.filename = options[b"filename"].decode("utf-8", errors="replace")
+            self._in_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.chunks.append(data[start:end])
+
+    def on_part_end(self):
+        self._in_file = False
+
+
+@router.post("/upload", openapi_extra=UPLOAD_REQUEST_BODY)
+async def upload_receipt(request: Request):
+    # The body is parsed here rather than through UploadFile, which would
+    # spool the whole upload to a temp file before the size could be checked
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() \
+            and int(content_length) > settings.RECEIPT_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+        raise _too_large()
 
     UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-    receipt_id = f"{uuid.uuid4().hex}{extension}"
-    destination = UPLOAD_DIR / receipt_id
 
-    contents = await file.read()
-    destination.write_bytes(contents)
+    # Stream to a temp file next to the destination so the final rename is
+    # atomic, hashing as we go. Receipts are stored under their SHA-256, so
+    # identical uploads resolve to the same receipt ID.
+    receipt = ReceiptPart()
+    parser = MultipartParser(params[b"boundary"], receipt.callbacks())
+    extension = None
+    digest = hashlib.sha256()
+    size = 0
+    temp = tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, suffix=".part", delete=False)
+    try:
+        with temp:
+            async for body in request.stream():
+                try:
+                    parser.write(body)
+                except ParseError:
+                    raise HTTPException(status_code=400, detail="Malformed multipart upload")
+
+                if receipt.filename is not None and extension is None:
+                    extension = Path(receipt.filename).suffix.lower()
+                    if not receipt.filename:
+                        raise HTTPException(status_code=400, detail="Missing receipt filename")
+                    if extension not in ALLOWED_EXTENSIONS:
+                        raise HTTPException(status_code=400, detail="Unsupported receipt file type")
+
+                if receipt.chunks:
+                    chunk = b"".join(receipt.chunks)
+                    receipt.chunks.clear()
+                    size += len(chunk)
+                    if size > settings.RECEIPT_MAX_UPLOAD_BYTES:
+                        raise _too_large()
+                    digest.update(chunk)
+                    await run_in_threadpool(temp.write, chunk)
+            parser.finalize()
+
+        if receipt.filename is None:
+            raise HTTPException(status_code=400, detail="Missing receipt file")
+
+        content_hash = digest.hexdigest()
+        existing = find_receipt(content_hash)
+        if existing is not None:
+            os.unlink(temp.name)
+            return {
+                "receipt_id": existing.name,
+                "filename": receipt.filename,
+                "sha256": content_hash,
+                "duplicate": True,
+            }
+
+        receipt_id = f"{content_hash}{extension}"
+        os.replace(temp.name, UPLOAD_DIR / receipt_id)
+    except BaseException:
+        if os.path.exists(temp.name):
+            os.unlink(temp.name)
+        raise
 
     return {
         "receipt_id": receipt_id,
-        "filename": file.filename,
+        "filename": receipt.filename,
+        "sha256": content_hash,
+        "duplicate": False,
     }
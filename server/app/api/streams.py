@@ -1,14 +1,15 @@
-from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.config import RELEASE_STAGES
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_async_db
 from app.models.stream import Proof, ProofStatus, Stream
-from app.services.ml_service import ml_service
+from app.services.proof_pipeline import proof_pipeline, verify_proof
 from app.services.streamflow_service import streamflow_service
 
 router = APIRouter()
@@ -28,6 +29,27 @@ class StartStreamResponse(BaseModel):
     initial_release: dict
 
 
+class BatchStartRequest(BaseModel):
+    streams: List[StartStreamRequest] = Field(..., min_length=1)
+
+
+class BatchStartItemResult(BaseModel):
+    index: int
+    fundee_public_key: str
+    success: bool
+    retryable: Optional[bool] = None
+    stream_id: Optional[str] = None
+    status: Optional[str] = None
+    initial_release: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class BatchStartResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchStartItemResult]
+
+
 class ProofSubmitRequest(BaseModel):
     stream_id: str = Field(..., description="Stream identifier")
     stage_index: int = Field(..., ge=0, le=3, description="Stage index (0-3)")
@@ -47,6 +69,26 @@ class ProofSubmitResponse(BaseModel):
     next_stage_release: Optional[dict] = None
 
 
+class ProofAcceptedResponse(BaseModel):
+    proof_id: int
+    stream_id: str
+    stage_index: int
+    status: str
+
+
+class ProofStatusResponse(BaseModel):
+    proof_id: int
+    stream_id: str
+    stage_index: int
+    status: str
+    ml_confidence: Optional[float] = None
+    ml_explanation: Optional[str] = None
+    created_at: str
+    verified_at: Optional[str] = None
+    release_signature: Optional[str] = None
+    release_error: Optional[str] = None
+
+
 class StageStatusResponse(BaseModel):
     index: int
     percentage: int
@@ -72,7 +114,7 @@ class StreamStatusResponse(BaseModel):
 
 
 @router.post("/start", response_model=StartStreamResponse)
-async def start_stream(request: StartStreamRequest, db: Session = Depends(get_db)):
+async def start_stream(request: StartStreamRequest, db: AsyncSession = Depends(get_async_db)):
     try:
         # Create the stream
         stream = await streamflow_service.create_stream(
@@ -103,10 +145,48 @@ async def start_stream(request: StartStreamRequest, db: Session = Depends(get_db
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/proof", response_model=ProofSubmitResponse)
-async def submit_proof(request: ProofSubmitRequest, db: Session = Depends(get_db)):
+@router.post("/batch", response_model=BatchStartResponse, response_model_exclude_none=True)
+async def start_streams_batch(request: BatchStartRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Start many streams at once (e.g. a campaign launch). The on-chain
+    streams are created in one call to the Node service and stored in one
+    transaction; each item reports its own success or error. Items marked
+    retryable were created but their initial release failed; POST
+    /{stream_id}/resume retries it.
+    """
+    if len(request.streams) > settings.STREAM_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds maximum of {settings.STREAM_BATCH_MAX_ITEMS} streams",
+        )
+
+    try:
+        results = await streamflow_service.create_streams_batch(
+            db,
+            [(item.fundee_public_key, item.total_amount_sol) for item in request.streams],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    succeeded = sum(1 for result in results if result["success"])
+    return BatchStartResponse(
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        results=[BatchStartItemResult(**result) for result in results],
+    )
+
+
+@router.post(
+    "/proof",
+    response_model=ProofSubmitResponse,
+    responses={202: {"model": ProofAcceptedResponse}},
+)
+async def submit_proof(request: ProofSubmitRequest, db: AsyncSession = Depends(get_async_db)):
     # Validate stream exists
-    stream = db.query(Stream).filter(Stream.stream_id == request.stream_id).first()
+    result = await db.execute(select(Stream).where(Stream.stream_id == request.stream_id))
+    stream = result.scalars().first()
     if not stream:
         raise HTTPException(status_code=404, detail=f"Stream not found: {request.stream_id}")
 
@@ -117,117 +197,143 @@ async def submit_proof(request: ProofSubmitRequest, db: Session = Depends(get_db
             detail=f"Invalid stage. Current stage is {stream.current_stage}, got {request.stage_index}",
         )
 
+    result = await db.execute(
+        select(Proof.id).where(
+            Proof.stream_id == stream.id,
+            Proof.stage_index == request.stage_index,
+            Proof.status == ProofStatus.PENDING,
+        )
+    )
+    pending_id = result.scalars().first()
+    if pending_id is not None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Proof {pending_id} for stage {request.stage_index} is still being verified",
+        )
+
     # Create proof record
     proof = Proof(
         stream_id=stream.id,
         stage_index=request.stage_index,
         file_url=request.file_url,
+        categories=request.categories,
         status=ProofStatus.PENDING,
     )
     db.add(proof)
-    db.commit()
-    db.refresh(proof)
-
-    # Call ML service for verification
-    verification_result = await ml_service.verify_receipt(
-        campaign_id=stream.stream_id,
-        file_url=request.file_url,
-        categories=request.categories,
-    )
-
-    next_stage_release = None
-
-    if not verification_result["verified"]:
-        # Mark proof as rejected
-        proof.status = ProofStatus.REJECTED
-        proof.ml_confidence = verification_result.get("confidence", 0.0)
-        proof.ml_explanation = verification_result.get("explanation", "")
-        db.commit()
-
-        return ProofSubmitResponse(
-            proof_id=proof.id,
-            stream_id=request.stream_id,
-            stage_index=request.stage_index,
-            status="rejected",
-            verification_result=verification_result,
-            next_stage_release=None,
+    await db.commit()
+    await db.refresh(proof)
+
+    if settings.PROOF_PIPELINE_ENABLED:
+        # Verification and stage release happen in the background; poll
+        # /streams/proof/{proof_id} for the outcome
+        proof_pipeline.submit(proof.id)
+        return JSONResponse(
+            status_code=202,
+            content=ProofAcceptedResponse(
+                proof_id=proof.id,
+                stream_id=request.stream_id,
+                stage_index=request.stage_index,
+                status=ProofStatus.PENDING.value,
+            ).model_dump(),
         )
 
-    # Mark proof as verified
-    proof.status = ProofStatus.VERIFIED
-    proof.ml_confidence = verification_result.get("confidence", 0.0)
-    proof.ml_explanation = verification_result.get("explanation", "")
-    proof.verified_at = datetime.utcnow()
-    db.commit()
-
-    # Calculate next stage
-    next_stage_index = request.stage_index + 1
-
-    # Check if there's a next stage
-    if next_stage_index < len(RELEASE_STAGES):
-        try:
-            # Release next stage
-            release_result = await streamflow_service.withdraw_stage(
-                db, request.stream_id, next_stage_index
-            )
-            next_stage_release = {
-                "stage": next_stage_index + 1,
-                "percentage": release_result["percentage"],
-                "amount_sol": release_result["amount_sol"],
-                "transaction_signature": release_result["transaction_signature"],
-                "total_released_percentage": release_result["total_released_percentage"],
-            }
-        except Exception as e:
-            next_stage_release = {"error": str(e)}
-    else:
-        # All stages completed
-        stream.status = "completed"
-        db.commit()
+    outcome = await verify_proof(db, proof, stream)
 
     return ProofSubmitResponse(
         proof_id=proof.id,
         stream_id=request.stream_id,
         stage_index=request.stage_index,
-        status="verified",
-        verification_result=verification_result,
-        next_stage_release=next_stage_release,
+        **outcome,
+    )
+
+
+@router.get("/proof/{proof_id}", response_model=ProofStatusResponse)
+async def get_proof_status(proof_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get the verification status of a submitted proof."""
+    proof = await db.get(Proof, proof_id)
+    if proof is None:
+        raise HTTPException(status_code=404, detail=f"Proof not found: {proof_id}")
+    stream = await db.get(Stream, proof.stream_id)
+
+    return ProofStatusResponse(
+        proof_id=proof.id,
+        stream_id=stream.stream_id,
+        stage_index=proof.stage_index,
+        status=proof.status.value,
+        ml_confidence=proof.ml_confidence,
+        ml_explanation=proof.ml_explanation,
+        created_at=proof.created_at.isoformat(),
+        verified_at=proof.verified_at.isoformat() if proof.verified_at else None,
+        release_signature=proof.release_signature,
+        release_error=proof.release_error,
     )
 
 
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    if etag is None:
+        return False
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
 @router.get("/{stream_id}/status", response_model=StreamStatusResponse)
-def get_stream_status(stream_id: str, db: Session = Depends(get_db)):
+async def get_stream_status(
+    stream_id: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     Get the current status of a stream including all stage details.
+
+    Responses carry an ETag; polls sending it back in If-None-Match get a
+    304 straight from the snapshot cache while the stream is unchanged.
     """
+    cached_etag = streamflow_service.cached_status_etag(stream_id)
+    if etag_matches(request, cached_etag):
+        return not_modified(cached_etag)
+
     try:
-        status = streamflow_service.get_stream_status(db, stream_id)
-        return StreamStatusResponse(**status)
+        status, etag = await streamflow_service.get_stream_snapshot(db, stream_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return StreamStatusResponse(**status)
+
 
 @router.post("/{stream_id}/pause")
-def pause_stream(stream_id: str, db: Session = Depends(get_db)):
+async def pause_stream(stream_id: str, db: AsyncSession = Depends(get_async_db)):
     """Pause a stream (admin operation)."""
     try:
-        stream = streamflow_service.pause_stream(db, stream_id)
+        stream = await streamflow_service.pause_stream(db, stream_id)
         return {"stream_id": stream.stream_id, "status": stream.status.value}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
 @router.post("/{stream_id}/resume")
-def resume_stream(stream_id: str, db: Session = Depends(get_db)):
+async def resume_stream(stream_id: str, db: AsyncSession = Depends(get_async_db)):
     """Resume a paused stream (admin operation)."""
     try:
-        stream = streamflow_service.resume_stream(db, stream_id)
+        stream = await streamflow_service.resume_stream(db, stream_id)
         return {"stream_id": stream.stream_id, "status": stream.status.value}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/{stream_id}/cancel")
-async def cancel_stream(stream_id: str, db: Session = Depends(get_db)):
+async def cancel_stream(stream_id: str, db: AsyncSession = Depends(get_async_db)):
     """Cancel a stream and return remaining funds to sender."""
     try:
         result = await streamflow_service.cancel_stream(db, stream_id)
@@ -21,13 +21,54 @@ class Settings(BaseSettings):
 
     # Streamflow Node Service
     STREAMFLOW_SERVICE_URL: str = "http://localhost:3001"
+    STREAMFLOW_SERVICE_TIMEOUT: float = 60.0
+    STREAMFLOW_MAX_CONNECTIONS: int = 20
+    STREAMFLOW_BATCH_TIMEOUT: float = 300.0
+    STREAM_BATCH_MAX_ITEMS: int = 500
+    # Snapshot cache for GET /streams/{id}/status. Writes in this process
+    # invalidate entries; the TTL bounds staleness across worker processes
+    STREAM_STATUS_CACHE_TTL: float = 30.0
+    STREAM_STATUS_CACHE_MAX_ITEMS: int = 1024
 
     # ML Service Configuration
     ML_SERVICE_URL: str = "http://localhost:8001"
+    ML_SERVICE_TIMEOUT: float = 60.0  # OCR can take time
+    ML_SERVICE_MAX_CONNECTIONS: int = 20
+    ML_SERVICE_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    ML_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    ML_CIRCUIT_RESET_SECONDS: float = 30.0
+    ML_RESPONSE_SHAPE: str = "snippet"  # verdict, snippet or full
+
+    # Background proof verification: /streams/proof answers 202 and a
+    # worker pool verifies the proof and releases the next stage
+    PROOF_PIPELINE_ENABLED: bool = True
+    PROOF_PIPELINE_WORKERS: int = 4
+    PROOF_PIPELINE_MAX_ATTEMPTS: int = 5
+    PROOF_PIPELINE_RETRY_SECONDS: float = 30.0
+    # How long a worker owns a claimed proof; must cover the ML call and
+    # the stage release. Proofs whose lease runs out are picked up again.
+    PROOF_PIPELINE_LEASE_SECONDS: float = 300.0
+
+    # Receipt uploads
+    RECEIPT_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
 
     # Database
     DATABASE_URL: str = "sqlite:///./charitable.db"
 
+    # SQLite storage profile, applied to every new connection
+    SQLITE_TUNING: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 15000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+
+    # Connection pool (Postgres and other server databases)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+
     class Config:
         env_file = ".env"
         extra = "ignore"
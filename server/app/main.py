@@ -5,14 +5,25 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.routes import router as api_router
 from app.core.config import settings
-from app.core.database import init_db
+from app.core.database import close_db, init_db
+from app.services.ml_service import ml_service
+from app.services.proof_pipeline import proof_pipeline
+from app.services.streamflow_service import streamflow_service
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup."""
+    """Initialize database and shared HTTP clients on startup."""
     init_db()
+    await ml_service.start()
+    await streamflow_service.start()
+    if settings.PROOF_PIPELINE_ENABLED:
+        await proof_pipeline.start()
     yield
+    await proof_pipeline.stop()
+    await ml_service.close()
+    await streamflow_service.close()
+    await close_db()
 
 
 app = FastAPI(
@@ -39,4 +50,9 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "ml_client": ml_service.stats(),
+        "proof_pipeline": proof_pipeline.stats(),
+        "streamflow": streamflow_service.stats(),
+    }
@@ -1,7 +1,7 @@
 from datetime import datetime
 from enum import Enum as PyEnum
 
-from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Integer, String
+from sqlalchemy import JSON, Boolean, Column, DateTime, Enum, Float, ForeignKey, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -63,10 +63,19 @@ class Proof(Base):
     stream_id = Column(Integer, ForeignKey("streams.id"), nullable=False)
     stage_index = Column(Integer, nullable=False)
     file_url = Column(String, nullable=False)
+    categories = Column(JSON, nullable=True)
     status = Column(Enum(ProofStatus), default=ProofStatus.PENDING)
     ml_confidence = Column(Float, nullable=True)
     ml_explanation = Column(String, nullable=True)
+    # The ML service's own verdict, NULL when it never gave one (outage).
+    # Differs from status when the stream blocked a verified proof.
+    ml_verified = Column(Boolean, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     verified_at = Column(DateTime, nullable=True)
+    # Outcome of releasing the next stage once the proof is verified
+    release_signature = Column(String, nullable=True)
+    release_error = Column(String, nullable=True)
+    # Set while a pipeline worker owns the proof
+    lease_expires = Column(DateTime, nullable=True)
 
     stream = relationship("Stream", back_populates="proofs")
@@ -1,5 +1,7 @@
+import asyncio
 import logging
-from typing import List, Optional
+import time
+from typing import Dict, List, Optional
 
 import httpx
 
@@ -8,11 +10,102 @@ from app.core.config import settings
 logger = logging.getLogger(__name__)
 
 
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures so callers fail
+    fast, and allows a recovery probe once `reset_seconds` have passed.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def ready_to_probe(self) -> bool:
+        return self.is_open and time.monotonic() - self.opened_at >= self.reset_seconds
+
+    def record_success(self):
+        if self.is_open:
+            logger.info("ML service circuit closed")
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.is_open or self.failures >= self.failure_threshold:
+            if not self.is_open:
+                logger.warning(f"ML service circuit opened after {self.failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
 class MLVerificationService:
 
     def __init__(self):
         self.base_url = settings.ML_SERVICE_URL
-        self.timeout = 60.0  # OCR can take time
+        self.timeout = settings.ML_SERVICE_TIMEOUT
+        self.breaker = CircuitBreaker(
+            settings.ML_CIRCUIT_FAILURE_THRESHOLD,
+            settings.ML_CIRCUIT_RESET_SECONDS,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self._probe_lock = asyncio.Lock()
+        self._in_flight: Dict[tuple, asyncio.Future] = {}
+        self.coalesced_calls = 0
+
+    async def start(self):
+        """Open the shared connection pool (called from the app lifespan)."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.ML_SERVICE_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.ML_SERVICE_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            await self.start()
+        return self._client
+
+    async def _circuit_allows(self) -> bool:
+        if not self.breaker.is_open:
+            return True
+        if not self.breaker.ready_to_probe() or self._probe_lock.locked():
+            return False
+
+        async with self._probe_lock:
+            if await self.health_check():
+                self.breaker.record_success()
+                return True
+            self.breaker.record_failure()
+            return False
+
+    def _unavailable(self, categories: List[str], error: str) -> dict:
+        return {
+            "verified": False,
+            "confidence": 0.0,
+            "matched_categories": [],
+            "missing_categories": categories,
+            "explanation": "ML service unavailable",
+            "error": error,
+        }
 
     async def verify_receipt(
         self,
@@ -20,41 +113,64 @@ class MLVerificationService:
         file_url: str,
         categories: Optional[List[str]] = None,
     ) -> dict:
+        """
+        Verify a receipt with the ML service. Concurrent calls for the same
+        (campaign, file, categories) share a single in-flight request.
+        """
         if categories is None:
             categories = ["donation", "charity", "receipt", "payment"]
 
+        key = (campaign_id, file_url, tuple(sorted(categories)))
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.coalesced_calls += 1
+            logger.info(f"Coalescing duplicate verification for campaign {campaign_id}")
+        else:
+            in_flight = asyncio.ensure_future(self._verify_receipt(campaign_id, file_url, categories))
+            self._in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # Shield so one caller going away does not cancel the shared call
+        return dict(await asyncio.shield(in_flight))
+
+    async def _verify_receipt(self, campaign_id: str, file_url: str, categories: List[str]) -> dict:
+        if not await self._circuit_allows():
+            logger.warning(f"ML service circuit open, skipping verification for campaign {campaign_id}")
+            return self._unavailable(categories, "circuit breaker open")
+
         payload = {
             "campaignId": campaign_id,
             "fileUrl": file_url,
             "categories": categories,
+            "responseShape": settings.ML_RESPONSE_SHAPE,
         }
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/verify",
-                    json=payload,
-                )
-                response.raise_for_status()
-                result = response.json()
-
-                logger.info(
-                    f"ML verification for campaign {campaign_id}: "
-                    f"passed={result.get('passed')}, confidence={result.get('confidence')}"
-                )
-
-                return {
-                    "verified": result.get("passed", False),
-                    "confidence": result.get("confidence", 0.0),
-                    "matched_categories": result.get("matched_categories", []),
-                    "missing_categories": result.get("missing_categories", []),
-                    "explanation": result.get("explanation", ""),
-                    "ocr_text": result.get("ocr_text", ""),
-                    "details": result.get("details", {}),
-                }
+            client = await self._get_client()
+            response = await client.post("/verify", json=payload)
+            response.raise_for_status()
+            result = response.json()
+            self.breaker.record_success()
+
+            logger.info(
+                f"ML verification for campaign {campaign_id}: "
+                f"passed={result.get('passed')}, confidence={result.get('confidence')}"
+            )
+
+            return {
+                "verified": result.get("passed", False),
+                "confidence": result.get("confidence", 0.0),
+                "matched_categories": result.get("matched_categories", []),
+                "missing_categories": result.get("missing_categories", []),
+                "explanation": result.get("explanation", ""),
+                "ocr_text": result.get("ocr_text", ""),
+                "details": result.get("details", {}),
+            }
 
         except httpx.HTTPStatusError as e:
             logger.error(f"ML service HTTP error: {e.response.status_code} - {e.response.text}")
+            if e.response.status_code >= 500:
+                self.breaker.record_failure()
             return {
                 "verified": False,
                 "confidence": 0.0,
@@ -66,20 +182,21 @@ class MLVerificationService:
 
         except httpx.RequestError as e:
             logger.error(f"ML service connection error: {e}")
-            return {
-                "verified": False,
-                "confidence": 0.0,
-                "matched_categories": [],
-                "missing_categories": categories,
-                "explanation": "ML service unavailable",
-                "error": str(e),
-            }
+            self.breaker.record_failure()
+            return self._unavailable(categories, str(e))
+
+    def stats(self) -> dict:
+        return {
+            "circuit_state": self.breaker.state,
+            "in_flight": len(self._in_flight),
+            "coalesced_calls": self.coalesced_calls,
+        }
 
     async def health_check(self) -> bool:
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{self.base_url}/health")
-                return response.status_code == 200
+            client = await self._get_client()
+            response = await client.get("/health", timeout=5.0)
+            return response.status_code == 200
         except Exception:
             return False
 
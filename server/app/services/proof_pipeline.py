@@ -0,0 +1,334 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Set
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import RELEASE_STAGES, settings
+from app.core.database import AsyncSessionLocal
+from app.models.stream import Proof, ProofStatus, StageStatus, Stream, StreamStage, StreamStatus
+from app.services.ml_service import ml_service
+from app.services.streamflow_service import streamflow_service
+
+logger = logging.getLogger(__name__)
+
+
+async def verify_proof(db: AsyncSession, proof: Proof, stream: Stream) -> dict:
+    """
+    Verify a PENDING proof with the ML service, record the verdict and, if
+    it passed, release the next stage (or complete the stream).
+    """
+    # Don't hold a transaction open across the ML call
+    await db.commit()
+
+    try:
+        verification_result = await ml_service.verify_receipt(
+            campaign_id=stream.stream_id,
+            file_url=proof.file_url,
+            categories=proof.categories,
+        )
+        return await record_verdict(db, proof, stream, verification_result)
+    except Exception as e:
+        # Nothing recovers inline proofs, and a PENDING one blocks every
+        # later submission for its stage; settle it as rejected
+        await fail_pending_proof(proof.id, f"Verification failed: {e}")
+        raise
+
+
+async def fail_pending_proof(proof_id: int, explanation: str):
+    """Reject a proof that is still PENDING, in a fresh session."""
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Proof)
+            .where(Proof.id == proof_id, Proof.status == ProofStatus.PENDING)
+            .values(status=ProofStatus.REJECTED, ml_explanation=explanation, lease_expires=None)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+
+def release_blocker(proof: Proof, stream: Stream) -> Optional[str]:
+    """Why a verified proof can no longer release the next stage, or None if it can."""
+    if stream.status != StreamStatus.ACTIVE:
+        return f"Stream is {stream.status.value}"
+    if proof.stage_index != stream.current_stage:
+        return f"Stream is at stage {stream.current_stage}, proof was for stage {proof.stage_index}"
+    return None
+
+
+async def record_verdict(db: AsyncSession, proof: Proof, stream: Stream, verification_result: dict) -> dict:
+    """Apply an ML verdict to a proof and release the next stage if it passed."""
+    proof.ml_confidence = verification_result.get("confidence", 0.0)
+    proof.ml_explanation = verification_result.get("explanation", "")
+    proof.ml_verified = None if "error" in verification_result else bool(verification_result["verified"])
+
+    if verification_result["verified"]:
+        # The stream may have been paused, cancelled or moved on while the
+        # ML service was looking at the receipt
+        await db.refresh(stream)
+        blocker = release_blocker(proof, stream)
+        if blocker is not None:
+            proof.ml_explanation = f"{blocker}; no stage was released"
+            verification_result = {**verification_result, "verified": False}
+
+    if not verification_result["verified"]:
+        proof.status = ProofStatus.REJECTED
+        await db.commit()
+        return {"status": "rejected", "verification_result": verification_result, "next_stage_release": None}
+
+    proof.status = ProofStatus.VERIFIED
+    proof.verified_at = datetime.utcnow()
+    await db.commit()
+
+    next_stage_release = None
+    if proof.stage_index + 1 < len(RELEASE_STAGES):
+        next_stage_release = await release_next_stage(db, proof, stream)
+    else:
+        # All stages completed
+        stream.status = StreamStatus.COMPLETED
+        await db.commit()
+        streamflow_service.invalidate_status(stream.stream_id)
+
+    return {
+        "status": "verified",
+        "verification_result": verification_result,
+        "next_stage_release": next_stage_release,
+    }
+
+
+async def release_next_stage(db: AsyncSession, proof: Proof, stream: Stream) -> dict:
+    """
+    Release the stage after a VERIFIED proof's and record the outcome on
+    the proof. A failed release leaves release_error set; the pipeline
+    retries it while the stream stays active on that stage.
+    """
+    next_stage_index = proof.stage_index + 1
+    try:
+        release_result = await streamflow_service.withdraw_stage(db, stream.stream_id, next_stage_index)
+    except Exception as e:
+        logger.warning(f"Release of stage {next_stage_index} for proof {proof.id} failed: {e}")
+        proof.release_error = str(e)
+        await db.commit()
+        return {"error": str(e)}
+
+    proof.release_signature = release_result["transaction_signature"]
+    proof.release_error = None
+    await db.commit()
+    return {
+        "stage": next_stage_index + 1,
+        "percentage": release_result["percentage"],
+        "amount_sol": release_result["amount_sol"],
+        "transaction_signature": release_result["transaction_signature"],
+        "total_released_percentage": release_result["total_released_percentage"],
+    }
+
+
+class ProofPipeline:
+    """
+    Verifies submitted proofs in the background. A pool of worker tasks
+    takes proof IDs off a queue and drives each proof from PENDING to
+    VERIFIED/REJECTED and on to the next stage release. Releases that fail
+    are recorded on the proof and retried.
+
+    A worker claims a proof by setting its lease in the database, so when
+    several app processes share the database each proof is verified once.
+    Proofs with work left and no live lease (e.g. after a crash or a failed
+    release) are queued again at startup and every
+    PROOF_PIPELINE_RETRY_SECONDS.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = max(1, workers or settings.PROOF_PIPELINE_WORKERS)
+        self.max_attempts = settings.PROOF_PIPELINE_MAX_ATTEMPTS
+        self.retry_seconds = settings.PROOF_PIPELINE_RETRY_SECONDS
+        self.lease_seconds = settings.PROOF_PIPELINE_LEASE_SECONDS
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list = []
+        self._retries: Set[asyncio.Task] = set()
+        self._queued: Set[int] = set()
+        self._attempts: dict = {}
+        self.processed = 0
+        self.retried = 0
+        self.recovered = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        """Start the workers and the recovery loop (called from the app lifespan)."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recover_loop()))
+        logger.info(f"Proof pipeline started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks + list(self._retries):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retries, return_exceptions=True)
+        self._tasks = []
+        self._retries.clear()
+        self._queue = None
+        self._queued.clear()
+
+    def submit(self, proof_id: int):
+        if proof_id in self._queued:
+            return
+        self._queued.add(proof_id)
+        self._queue.put_nowait(proof_id)
+
+    async def recover(self) -> int:
+        """
+        Queue proofs no worker holds a lease on that still need work:
+        PENDING ones, and VERIFIED ones whose next stage was not released
+        while the stream is still active on their stage.
+        """
+        unleased = or_(Proof.lease_expires.is_(None), Proof.lease_expires <= datetime.utcnow())
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Proof.id).where(Proof.status == ProofStatus.PENDING, unleased)
+            )
+            proof_ids = set(result.scalars().all())
+            result = await db.execute(
+                select(Proof.id)
+                .join(Stream, Proof.stream_id == Stream.id)
+                .join(
+                    StreamStage,
+                    and_(StreamStage.stream_id == Stream.id, StreamStage.stage_index == Proof.stage_index + 1),
+                )
+                .where(
+                    Proof.status == ProofStatus.VERIFIED,
+                    Stream.status == StreamStatus.ACTIVE,
+                    Stream.current_stage == Proof.stage_index,
+                    StreamStage.status == StageStatus.PENDING,
+                    unleased,
+                )
+            )
+            proof_ids.update(result.scalars().all())
+        recovered = [proof_id for proof_id in sorted(proof_ids) if proof_id not in self._queued]
+        for proof_id in recovered:
+            self.submit(proof_id)
+        if recovered:
+            self.recovered += len(recovered)
+            logger.info(f"Proof pipeline recovered {len(recovered)} proofs")
+        return len(recovered)
+
+    async def _recover_loop(self):
+        while True:
+            try:
+                await self.recover()
+            except Exception:
+                logger.exception("Proof pipeline recovery failed")
+            await asyncio.sleep(self.retry_seconds)
+
+    def _retry_later(self, proof_id: int):
+        async def retry():
+            await asyncio.sleep(self.retry_seconds)
+            self.submit(proof_id)
+
+        task = asyncio.create_task(retry())
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _claim(self, db: AsyncSession, proof_id: int) -> bool:
+        """
+        Take the lease on a proof that may still need work (PENDING, or
+        VERIFIED without a release); False if another worker holds it.
+        """
+        now = datetime.utcnow()
+        result = await db.execute(
+            update(Proof)
+            .where(
+                Proof.id == proof_id,
+                or_(
+                    Proof.status == ProofStatus.PENDING,
+                    and_(Proof.status == ProofStatus.VERIFIED, Proof.release_signature.is_(None)),
+                ),
+                or_(Proof.lease_expires.is_(None), Proof.lease_expires <= now),
+            )
+            .values(lease_expires=now + timedelta(seconds=self.lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def _worker(self):
+        while True:
+            proof_id = await self._queue.get()
+            self._queued.discard(proof_id)
+            try:
+                await self.process(proof_id)
+            except Exception:
+                logger.exception(f"Proof {proof_id} failed in the verification pipeline")
+            finally:
+                self._queue.task_done()
+
+    async def process(self, proof_id: int):
+        async with AsyncSessionLocal() as db:
+            if not await self._claim(db, proof_id):
+                return
+            proof = await db.get(Proof, proof_id)
+            stream = await db.get(Stream, proof.stream_id)
+            await db.commit()
+
+            if proof.status == ProofStatus.VERIFIED:
+                await self._retry_release(db, proof, stream)
+                return
+
+            verification_result = await ml_service.verify_receipt(
+                campaign_id=stream.stream_id,
+                file_url=proof.file_url,
+                categories=proof.categories,
+            )
+
+            # ML outages leave the proof PENDING and retry it later rather
+            # than rejecting a receipt nobody has looked at. The lease is
+            # kept until the retry so other processes leave it alone.
+            attempts = self._attempts.get(proof_id, 0) + 1
+            if "error" in verification_result and attempts < self.max_attempts:
+                self._attempts[proof_id] = attempts
+                self.retried += 1
+                logger.warning(
+                    f"Proof {proof_id} verification failed ({verification_result['error']}), "
+                    f"retry {attempts}/{self.max_attempts - 1} in {self.retry_seconds}s"
+                )
+                proof.lease_expires = datetime.utcnow() + timedelta(seconds=self.retry_seconds)
+                await db.commit()
+                self._retry_later(proof_id)
+                return
+            self._attempts.pop(proof_id, None)
+
+            # The lease is held through the stage release so no other
+            # process can retry the release at the same time
+            outcome = await record_verdict(db, proof, stream, verification_result)
+            proof.lease_expires = None
+            await db.commit()
+            self.processed += 1
+            logger.info(f"Proof {proof_id} {outcome['status']} for stream {stream.stream_id}")
+
+    async def _retry_release(self, db: AsyncSession, proof: Proof, stream: Stream):
+        """Release the stage a VERIFIED proof earned if an earlier attempt failed."""
+        if proof.stage_index + 1 < len(RELEASE_STAGES) and release_blocker(proof, stream) is None:
+            outcome = await release_next_stage(db, proof, stream)
+            if "error" not in outcome:
+                logger.info(f"Released stage {outcome['stage']} for proof {proof.id} on retry")
+        proof.lease_expires = None
+        await db.commit()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.PROOF_PIPELINE_ENABLED,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "retrying": len(self._attempts),
+            "processed": self.processed,
+            "retried": self.retried,
+            "recovered": self.recovered,
+        }
+
+
+proof_pipeline = ProofPipeline()
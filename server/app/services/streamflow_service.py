@@ -1,9 +1,14 @@
+import hashlib
+import json
 import logging
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional, Tuple
 
 import httpx
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import LAMPORTS_PER_SOL, RELEASE_STAGES, settings
 from app.models.stream import StageStatus, Stream, StreamStage, StreamStatus
@@ -21,6 +26,31 @@ class StreamflowService:
 
     def __init__(self):
         self.node_service_url = settings.STREAMFLOW_SERVICE_URL
+        self._client: Optional[httpx.AsyncClient] = None
+        # stream_id -> (expires_at, status dict, etag)
+        self._status_cache: OrderedDict = OrderedDict()
+        # Bumped on every invalidation so a load that raced a write isn't cached
+        self._status_generation = 0
+        self.status_cache_hits = 0
+        self.status_cache_misses = 0
+
+    async def start(self):
+        """Open the shared connection pool (called from the app lifespan)."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=settings.STREAMFLOW_SERVICE_TIMEOUT,
+                limits=httpx.Limits(max_connections=settings.STREAMFLOW_MAX_CONNECTIONS),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            await self.start()
+        return self._client
 
     def sol_to_lamports(self, sol_amount: float) -> int:
         return int(sol_amount * LAMPORTS_PER_SOL)
@@ -28,6 +58,17 @@ class StreamflowService:
     def lamports_to_sol(self, lamports: int) -> float:
         return lamports / LAMPORTS_PER_SOL
 
+    async def _get_stream(self, db: AsyncSession, stream_id: str) -> Stream:
+        # populate_existing: sessions don't expire on commit, so reload the
+        # row in case another request paused or cancelled the stream
+        result = await db.execute(
+            select(Stream).where(Stream.stream_id == stream_id).execution_options(populate_existing=True)
+        )
+        stream = result.scalars().first()
+        if not stream:
+            raise ValueError(f"Stream not found: {stream_id}")
+        return stream
+
     def calculate_stage_amount(self, total_amount: float, stage_index: int) -> float:
         if stage_index < 0 or stage_index >= len(RELEASE_STAGES):
             raise ValueError(f"Invalid stage index: {stage_index}")
@@ -36,7 +77,7 @@ class StreamflowService:
 
     async def create_stream(
         self,
-        db: Session,
+        db: AsyncSession,
         fundee_public_key: str,
         total_amount_sol: float,
     ) -> Stream:
@@ -49,32 +90,32 @@ class StreamflowService:
         total_lamports = self.sol_to_lamports(total_amount_sol)
 
         # Call Node service to create on-chain stream
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            try:
-                response = await client.post(
-                    f"{self.node_service_url}/streams/create",
-                    json={
-                        "recipientPublicKey": fundee_public_key,
-                        "totalAmountLamports": str(total_lamports),
-                    },
-                )
-                response.raise_for_status()
-                result = response.json()
+        client = await self._get_client()
+        try:
+            response = await client.post(
+                f"{self.node_service_url}/streams/create",
+                json={
+                    "recipientPublicKey": fundee_public_key,
+                    "totalAmountLamports": str(total_lamports),
+                },
+            )
+            response.raise_for_status()
+            result = response.json()
 
-                if not result.get("success"):
-                    raise RuntimeError(f"Stream creation failed: {result.get('error')}")
+            if not result.get("success"):
+                raise RuntimeError(f"Stream creation failed: {result.get('error')}")
 
-                stream_id = result["streamId"]
-                tx_signature = result["transactionSignature"]
+            stream_id = result["streamId"]
+            tx_signature = result["transactionSignature"]
 
-                logger.info(f"On-chain stream created: {stream_id}")
-                logger.info(f"Transaction: {tx_signature}")
+            logger.info(f"On-chain stream created: {stream_id}")
+            logger.info(f"Transaction: {tx_signature}")
 
-            except httpx.RequestError as e:
-                raise RuntimeError(f"Failed to connect to Streamflow service: {e}")
-            except httpx.HTTPStatusError as e:
-                error_detail = e.response.json().get("error", str(e))
-                raise RuntimeError(f"Streamflow service error: {error_detail}")
+        except httpx.RequestError as e:
+            raise RuntimeError(f"Failed to connect to Streamflow service: {e}")
+        except httpx.HTTPStatusError as e:
+            error_detail = e.response.json().get("error", str(e))
+            raise RuntimeError(f"Streamflow service error: {error_detail}")
 
         # Save to database
         stream = Stream(
@@ -86,7 +127,7 @@ class StreamflowService:
             released_amount_sol=0.0,
         )
         db.add(stream)
-        db.flush()
+        await db.flush()
 
         # Create stage records
         for stage_config in RELEASE_STAGES:
@@ -100,27 +141,143 @@ class StreamflowService:
             )
             db.add(stage)
 
-        db.commit()
-        db.refresh(stream)
+        await db.commit()
+        await db.refresh(stream)
 
         return stream
 
-    async def withdraw_stage(self, db: Session, stream_id: str, stage_index: int) -> dict:
+    async def create_streams_batch(self, db: AsyncSession, items: List[Tuple[str, float]]) -> List[dict]:
+        """
+        Create many streams with one call to the Node service, which also
+        releases each stream's first stage, and store every created stream
+        with its stages in a single transaction.
+
+        `items` are (fundee_public_key, total_amount_sol) pairs. Returns one
+        result per item, in order; items the Node service could not create
+        come back with success False and are not stored. A stream created
+        without its initial release is stored PAUSED and comes back with
+        success False and retryable True; resume_stream retries the release.
+        """
+        initial = RELEASE_STAGES[0]
+        payload = []
+        for fundee_public_key, total_amount_sol in items:
+            if total_amount_sol <= 0:
+                raise ValueError("Total amount must be greater than 0")
+            payload.append({
+                "recipientPublicKey": fundee_public_key,
+                "totalAmountLamports": str(self.sol_to_lamports(total_amount_sol)),
+                "initialReleaseLamports": str(
+                    self.sol_to_lamports(self.calculate_stage_amount(total_amount_sol, initial["index"]))
+                ),
+            })
+
+        client = await self._get_client()
+        try:
+            response = await client.post(
+                f"{self.node_service_url}/streams/batch",
+                json={"streams": payload},
+                timeout=settings.STREAMFLOW_BATCH_TIMEOUT,
+            )
+            response.raise_for_status()
+            node_results = {r["index"]: r for r in response.json()["results"]}
+        except httpx.RequestError as e:
+            raise RuntimeError(f"Failed to connect to Streamflow service: {e}")
+        except httpx.HTTPStatusError as e:
+            error_detail = e.response.json().get("error", str(e))
+            raise RuntimeError(f"Streamflow service error: {error_detail}")
+
+        now = datetime.utcnow()
+        results = []
+        streams = []
+        for index, (fundee_public_key, total_amount_sol) in enumerate(items):
+            node_result = node_results.get(index, {"success": False, "error": "Missing from batch response"})
+            if "streamId" not in node_result:
+                results.append({
+                    "index": index,
+                    "fundee_public_key": fundee_public_key,
+                    "success": False,
+                    "error": node_result.get("error", "Stream creation failed"),
+                })
+                continue
+
+            released = "withdrawSignature" in node_result
+            stream = Stream(
+                stream_id=node_result["streamId"],
+                fundee_public_key=fundee_public_key,
+                current_stage=0,
+                status=StreamStatus.ACTIVE if released else StreamStatus.PAUSED,
+                total_amount_sol=total_amount_sol,
+                released_amount_sol=0.0,
+            )
+            for stage_config in RELEASE_STAGES:
+                is_initial = released and stage_config["index"] == initial["index"]
+                stage_amount = self.calculate_stage_amount(total_amount_sol, stage_config["index"])
+                stream.stages.append(StreamStage(
+                    stage_index=stage_config["index"],
+                    percentage=stage_config["percentage"],
+                    amount_sol=stage_amount,
+                    status=StageStatus.RELEASED if is_initial else StageStatus.PENDING,
+                    released_at=now if is_initial else None,
+                ))
+                if is_initial:
+                    stream.released_amount_sol = stage_amount
+            streams.append(stream)
+
+            if released:
+                results.append({
+                    "index": index,
+                    "fundee_public_key": fundee_public_key,
+                    "success": True,
+                    "stream_id": stream.stream_id,
+                    "status": stream.status.value,
+                    "initial_release": {
+                        "stage": 1,
+                        "percentage": initial["percentage"],
+                        "amount_sol": stream.released_amount_sol,
+                        "transaction_signature": node_result["withdrawSignature"],
+                    },
+                })
+            else:
+                # The funds are locked on-chain, so keep the stream; resuming
+                # it retries the initial release
+                results.append({
+                    "index": index,
+                    "fundee_public_key": fundee_public_key,
+                    "success": False,
+                    "retryable": True,
+                    "stream_id": stream.stream_id,
+                    "status": stream.status.value,
+                    "error": f"Initial release failed: {node_result.get('withdrawError', 'unknown error')}",
+                })
+
+        # One transaction for every stream and stage row
+        db.add_all(streams)
+        await db.commit()
+
+        logger.info(f"Batch created {len(streams)} of {len(items)} streams")
+        return results
+
+    async def withdraw_stage(self, db: AsyncSession, stream_id: str, stage_index: int) -> dict:
         """
         Release funds for a specific stage via the Streamflow smart contract.
         """
-        stream = db.query(Stream).filter(Stream.stream_id == stream_id).first()
-        if not stream:
-            raise ValueError(f"Stream not found: {stream_id}")
+        stream = await self._get_stream(db, stream_id)
 
         if stage_index < 0 or stage_index >= len(RELEASE_STAGES):
             raise ValueError(f"Invalid stage index: {stage_index}")
 
-        stage = (
-            db.query(StreamStage)
-            .filter(StreamStage.stream_id == stream.id, StreamStage.stage_index == stage_index)
-            .first()
+        if stream.status in (StreamStatus.CANCELLED, StreamStatus.COMPLETED):
+            raise ValueError(f"Stream is {stream.status.value}")
+        # A new stream stays paused until its first stage is released
+        if stream.status == StreamStatus.PAUSED and stage_index > 0:
+            raise ValueError("Stream is paused")
+
+        result = await db.execute(
+            select(StreamStage).where(
+                StreamStage.stream_id == stream.id, StreamStage.stage_index == stage_index
+            )
         )
+        stage = result.scalars().first()
         if not stage:
             raise ValueError(f"Stage {stage_index} not found")
 
@@ -129,30 +286,34 @@ class StreamflowService:
 
         lamports = self.sol_to_lamports(stage.amount_sol)
 
+        # End the read transaction so no pooled connection (or SQLite read
+        # snapshot) is held while the Node service settles on-chain
+        await db.commit()
+
         # Call Node service to withdraw from on-chain stream
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            try:
-                response = await client.post(
-                    f"{self.node_service_url}/streams/withdraw",
-                    json={
-                        "streamId": stream_id,
-                        "amount": str(lamports),
-                    },
-                )
-                response.raise_for_status()
-                result = response.json()
+        client = await self._get_client()
+        try:
+            response = await client.post(
+                f"{self.node_service_url}/streams/withdraw",
+                json={
+                    "streamId": stream_id,
+                    "amount": str(lamports),
+                },
+            )
+            response.raise_for_status()
+            result = response.json()
 
-                if not result.get("success"):
-                    raise RuntimeError(f"Withdrawal failed: {result.get('error')}")
+            if not result.get("success"):
+                raise RuntimeError(f"Withdrawal failed: {result.get('error')}")
 
-                tx_signature = result["transactionSignature"]
-                logger.info(f"On-chain withdrawal successful: {tx_signature}")
+            tx_signature = result["transactionSignature"]
+            logger.info(f"On-chain withdrawal successful: {tx_signature}")
 
-            except httpx.RequestError as e:
-                raise RuntimeError(f"Failed to connect to Streamflow service: {e}")
-            except httpx.HTTPStatusError as e:
-                error_detail = e.response.json().get("error", str(e))
-                raise RuntimeError(f"Withdrawal failed: {error_detail}")
+        except httpx.RequestError as e:
+            raise RuntimeError(f"Failed to connect to Streamflow service: {e}")
+        except httpx.HTTPStatusError as e:
+            error_detail = e.response.json().get("error", str(e))
+            raise RuntimeError(f"Withdrawal failed: {error_detail}")
 
         # Update database
         stage.status = StageStatus.RELEASED
@@ -165,8 +326,9 @@ class StreamflowService:
         if stage_index == len(RELEASE_STAGES) - 1:
             stream.status = StreamStatus.COMPLETED
 
-        db.commit()
-        db.refresh(stream)
+        await db.commit()
+        await db.refresh(stream)
+        self.invalidate_status(stream_id)
 
         return {
             "stream_id": stream_id,
@@ -184,28 +346,69 @@ class StreamflowService:
 
     async def get_onchain_stream(self, stream_id: str) -> Optional[dict]:
         """Get stream info directly from the blockchain."""
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            try:
-                response = await client.get(f"{self.node_service_url}/streams/{stream_id}")
-                if response.status_code == 200:
-                    return response.json()
-                return None
-            except httpx.RequestError as e:
-                logger.warning(f"Failed to get on-chain stream: {e}")
-                return None
-
-    def get_stream_status(self, db: Session, stream_id: str) -> dict:
+        client = await self._get_client()
+        try:
+            response = await client.get(f"{self.node_service_url}/streams/{stream_id}", timeout=30.0)
+            if response.status_code == 200:
+                return response.json()
+            return None
+        except httpx.RequestError as e:
+            logger.warning(f"Failed to get on-chain stream: {e}")
+            return None
+
+    def invalidate_status(self, stream_id: str):
+        """Drop the cached status snapshot after the stream or its stages change."""
+        self._status_generation += 1
+        self._status_cache.pop(stream_id, None)
+
+    def cached_status_etag(self, stream_id: str) -> Optional[str]:
+        """ETag of a fresh cached snapshot, without touching the database."""
+        entry = self._status_cache.get(stream_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[2]
+
+    async def get_stream_snapshot(self, db: AsyncSession, stream_id: str) -> Tuple[dict, str]:
+        """Stream status and its ETag, served from the snapshot cache when fresh."""
+        entry = self._status_cache.get(stream_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._status_cache.move_to_end(stream_id)
+            self.status_cache_hits += 1
+            return entry[1], entry[2]
+
+        self.status_cache_misses += 1
+        generation = self._status_generation
+        status = await self._load_stream_status(db, stream_id)
+        digest = hashlib.sha256(json.dumps(status, sort_keys=True).encode()).hexdigest()
+        etag = f'"{digest[:32]}"'
+        if generation != self._status_generation:
+            return status, etag
+
+        self._status_cache[stream_id] = (
+            time.monotonic() + settings.STREAM_STATUS_CACHE_TTL,
+            status,
+            etag,
+        )
+        self._status_cache.move_to_end(stream_id)
+        while len(self._status_cache) > settings.STREAM_STATUS_CACHE_MAX_ITEMS:
+            self._status_cache.popitem(last=False)
+        return status, etag
+
+    async def get_stream_status(self, db: AsyncSession, stream_id: str) -> dict:
+        """Get stream status, from the snapshot cache when fresh."""
+        status, _ = await self.get_stream_snapshot(db, stream_id)
+        return status
+
+    async def _load_stream_status(self, db: AsyncSession, stream_id: str) -> dict:
         """Get stream status from database."""
-        stream = db.query(Stream).filter(Stream.stream_id == stream_id).first()
-        if not stream:
-            raise ValueError(f"Stream not found: {stream_id}")
+        stream = await self._get_stream(db, stream_id)
 
-        stages = (
-            db.query(StreamStage)
-            .filter(StreamStage.stream_id == stream.id)
+        result = await db.execute(
+            select(StreamStage)
+            .where(StreamStage.stream_id == stream.id)
             .order_by(StreamStage.stage_index)
-            .all()
         )
+        stages = result.scalars().all()
 
         released_percentage = sum(s.percentage for s in stages if s.status == StageStatus.RELEASED)
 
@@ -234,52 +437,66 @@ class StreamflowService:
             ],
         }
 
-    def pause_stream(self, db: Session, stream_id: str) -> Stream:
-        stream = db.query(Stream).filter(Stream.stream_id == stream_id).first()
-        if not stream:
-            raise ValueError(f"Stream not found: {stream_id}")
+    async def pause_stream(self, db: AsyncSession, stream_id: str) -> Stream:
+        stream = await self._get_stream(db, stream_id)
         stream.status = StreamStatus.PAUSED
-        db.commit()
-        db.refresh(stream)
+        await db.commit()
+        await db.refresh(stream)
+        self.invalidate_status(stream_id)
         return stream
 
-    def resume_stream(self, db: Session, stream_id: str) -> Stream:
-        stream = db.query(Stream).filter(Stream.stream_id == stream_id).first()
-        if not stream:
-            raise ValueError(f"Stream not found: {stream_id}")
+    async def resume_stream(self, db: AsyncSession, stream_id: str) -> Stream:
+        """
+        Reactivate a paused stream. If its initial release never went out
+        (it failed in start or batch creation), resuming retries it.
+        """
+        stream = await self._get_stream(db, stream_id)
         if stream.status == StreamStatus.COMPLETED:
             raise ValueError("Cannot resume a completed stream")
+
+        result = await db.execute(
+            select(StreamStage).where(StreamStage.stream_id == stream.id, StreamStage.stage_index == 0)
+        )
+        initial = result.scalars().first()
+        if initial is not None and initial.status == StageStatus.PENDING:
+            # withdraw_stage activates the stream once the release succeeds
+            await self.withdraw_stage(db, stream_id, 0)
+            return stream
+
         stream.status = StreamStatus.ACTIVE
-        db.commit()
-        db.refresh(stream)
+        await db.commit()
+        await db.refresh(stream)
+        self.invalidate_status(stream_id)
         return stream
 
-    async def cancel_stream(self, db: Session, stream_id: str) -> dict:
+    async def cancel_stream(self, db: AsyncSession, stream_id: str) -> dict:
         """Cancel stream and return remaining funds to sender."""
-        stream = db.query(Stream).filter(Stream.stream_id == stream_id).first()
-        if not stream:
-            raise ValueError(f"Stream not found: {stream_id}")
+        stream = await self._get_stream(db, stream_id)
 
         if stream.status == StreamStatus.COMPLETED:
             raise ValueError("Cannot cancel a completed stream")
 
+        # End the read transaction before the on-chain call, as in withdraw_stage
+        await db.commit()
+
         # Call Node service to cancel on-chain
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            try:
-                response = await client.post(
-                    f"{self.node_service_url}/streams/cancel",
-                    json={"streamId": stream_id},
-                )
-                response.raise_for_status()
-                result = response.json()
-                tx_signature = result.get("transactionSignature", "")
-            except Exception as e:
-                logger.warning(f"On-chain cancel failed: {e}")
-                tx_signature = ""
+        client = await self._get_client()
+        try:
+            response = await client.post(
+                f"{self.node_service_url}/streams/cancel",
+                json={"streamId": stream_id},
+            )
+            response.raise_for_status()
+            result = response.json()
+            tx_signature = result.get("transactionSignature", "")
+        except Exception as e:
+            logger.warning(f"On-chain cancel failed: {e}")
+            tx_signature = ""
 
         stream.status = StreamStatus.CANCELLED
-        db.commit()
-        db.refresh(stream)
+        await db.commit()
+        await db.refresh(stream)
+        self.invalidate_status(stream_id)
 
         return {
             "stream_id": stream_id,
@@ -287,5 +504,12 @@ class StreamflowService:
             "transaction_signature": tx_signature,
         }
 
+    def stats(self) -> dict:
+        return {
+            "status_cache_items": len(self._status_cache),
+            "status_cache_hits": self.status_cache_hits,
+            "status_cache_misses": self.status_cache_misses,
+        }
+
 
 streamflow_service = StreamflowService()
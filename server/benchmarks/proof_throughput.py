@@ -0,0 +1,221 @@
+"""
+Load test for concurrent proof submission through the streams API.
+
+Starts one local stub that stands in for both the Streamflow Node service
+and the ML service (each call sleeps --latency seconds), launches the API
+with uvicorn against a fresh SQLite database, creates --streams streams
+and then submits one proof per stream at --concurrency. When the API
+answers 202 (background verification), each proof is polled until it
+leaves PENDING. Reports proof throughput and p50/p95/p99 latency as JSON.
+
+Usage (from server/):
+    python benchmarks/proof_throughput.py [--streams 200] [--concurrency 50]
+        [--latency 0.05] [--output proof_throughput.json]
+
+To compare against an earlier revision, check it out next to this one and
+point --server-dir at it; the benchmark itself stays the same:
+    git worktree add /tmp/charitable-before <commit>
+    python benchmarks/proof_throughput.py --server-dir /tmp/charitable-before/server
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def make_handler(latency: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        def _reply(self, payload: dict):
+            data = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._reply({"status": "healthy"})
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            signature = uuid.uuid4().hex
+
+            if self.path == "/streams/create":
+                self._reply({"success": True, "streamId": uuid.uuid4().hex, "transactionSignature": signature})
+            elif self.path in ("/streams/withdraw", "/streams/cancel"):
+                self._reply({"success": True, "transactionSignature": signature})
+            elif self.path == "/verify":
+                self._reply({
+                    "passed": True,
+                    "confidence": 0.95,
+                    "matched_categories": ["food"],
+                    "missing_categories": [],
+                    "explanation": "Stub verdict",
+                })
+            else:
+                self.send_response(404)
+                self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def wait_for_server(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"API server exited with code {server.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.RequestError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("API server did not start")
+
+
+async def run_load(server: subprocess.Popen, base_url: str, streams: int, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        await wait_for_server(client, server)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def start_stream(i: int) -> str:
+            async with semaphore:
+                response = await client.post(
+                    "/api/v1/streams/start",
+                    json={"fundee_public_key": f"fundee-{i}", "total_amount_sol": 1.0},
+                )
+                if response.status_code != 200:
+                    raise RuntimeError(f"Stream creation failed: {response.text}")
+                return response.json()["stream_id"]
+
+        stream_ids = await asyncio.gather(*(start_stream(i) for i in range(streams)))
+
+        latencies = []
+        statuses = {}
+
+        async def submit_proof(stream_id: str):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/v1/streams/proof",
+                    json={
+                        "stream_id": stream_id,
+                        "stage_index": 0,
+                        "file_url": f"https://example.com/{stream_id}.png",
+                        "categories": ["food"],
+                    },
+                )
+                if response.status_code == 202:
+                    # Pipeline mode: wait for the background verification
+                    proof_id = response.json()["proof_id"]
+                    while True:
+                        await asyncio.sleep(0.2)
+                        try:
+                            poll = await client.get(f"/api/v1/streams/proof/{proof_id}")
+                        except httpx.TransportError:
+                            # A pooled keep-alive connection closed under load; poll again
+                            continue
+                        if poll.json()["status"] != "pending":
+                            break
+                latencies.append(time.perf_counter() - started)
+                key = str(response.status_code)
+                statuses[key] = statuses.get(key, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(submit_proof(stream_id) for stream_id in stream_ids))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "proofs": len(latencies),
+        "status_codes": statuses,
+        "elapsed_seconds": round(elapsed, 3),
+        "proofs_per_second": round(len(latencies) / elapsed, 2),
+        "latency_seconds": {
+            "mean": round(statistics.mean(latencies), 4),
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--server-dir", default=SERVER_DIR)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--stub-port", type=int, default=8098)
+    parser.add_argument("--api-port", type=int, default=8097)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    stub = StubServer(("127.0.0.1", args.stub_port), make_handler(args.latency))
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            "STREAMFLOW_SERVICE_URL": stub_url,
+            "ML_SERVICE_URL": stub_url,
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--port", str(args.api_port), "--log-level", "warning"],
+            cwd=args.server_dir,
+            env=env,
+        )
+        try:
+            results = asyncio.run(
+                run_load(server, f"http://127.0.0.1:{args.api_port}", args.streams, args.concurrency)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+            stub.shutdown()
+
+    results["config"] = {
+        "server_dir": os.path.abspath(args.server_dir),
+        "streams": args.streams,
+        "concurrency": args.concurrency,
+        "latency": args.latency,
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
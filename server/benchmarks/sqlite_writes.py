@@ -0,0 +1,178 @@
+"""
+Concurrent-write benchmark for the SQLite storage profile.
+
+Seeds a fresh database with --streams streams, then has --concurrency
+asyncio workers each run the write pattern of a verified proof (insert the
+proof, mark it verified, release the next stage and update the stream)
+through the async engine, once with SQLite's defaults and once with the
+tuned profile from core/database. Reports transactions per second,
+p50/p95 latency and how many transactions failed with "database is locked".
+
+Usage (from server/):
+    python benchmarks/sqlite_writes.py [--streams 200] [--concurrency 32]
+        [--output sqlite_writes.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from sqlalchemy import event, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.core.config import RELEASE_STAGES  # noqa: E402
+from app.core.database import Base, apply_sqlite_pragmas  # noqa: E402
+from app.models.stream import (  # noqa: E402
+    Proof,
+    ProofStatus,
+    StageStatus,
+    Stream,
+    StreamStage,
+    StreamStatus,
+)
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def seed(sessions, streams: int) -> list:
+    async with sessions() as db:
+        rows = []
+        for i in range(streams):
+            stream = Stream(
+                stream_id=f"bench-{i}",
+                fundee_public_key=f"fundee-{i}",
+                current_stage=0,
+                status=StreamStatus.ACTIVE,
+                total_amount_sol=1.0,
+            )
+            stream.stages = [
+                StreamStage(
+                    stage_index=stage["index"],
+                    percentage=stage["percentage"],
+                    amount_sol=stage["percentage"] / 100,
+                    status=StageStatus.RELEASED if stage["index"] == 0 else StageStatus.PENDING,
+                )
+                for stage in RELEASE_STAGES
+            ]
+            rows.append(stream)
+        db.add_all(rows)
+        await db.commit()
+        return [stream.id for stream in rows]
+
+
+async def verified_proof(sessions, stream_pk: int, stage_index: int):
+    """The commits submit_proof + withdraw_stage make for one verified proof."""
+    async with sessions() as db:
+        proof = Proof(stream_id=stream_pk, stage_index=stage_index, file_url="bench", status=ProofStatus.PENDING)
+        db.add(proof)
+        await db.commit()
+
+        proof.status = ProofStatus.VERIFIED
+        proof.ml_confidence = 0.95
+        proof.verified_at = datetime.utcnow()
+        await db.commit()
+
+        stage = (await db.execute(
+            select(StreamStage).where(
+                StreamStage.stream_id == stream_pk, StreamStage.stage_index == stage_index + 1
+            )
+        )).scalars().first()
+        stream = await db.get(Stream, stream_pk)
+        stage.status = StageStatus.RELEASED
+        stage.released_at = datetime.utcnow()
+        stream.current_stage = stage_index + 1
+        stream.released_amount_sol += stage.amount_sol
+        await db.commit()
+
+
+async def run_profile(tuned: bool, streams: int, concurrency: int) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}",
+            # Leave the driver's own 5 s lock timeout in place for the default run
+            connect_args={"check_same_thread": False},
+            pool_size=concurrency,
+        )
+        if tuned:
+            event.listen(engine.sync_engine, "connect", apply_sqlite_pragmas)
+
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        stream_pks = await seed(sessions, streams)
+
+        queue = asyncio.Queue()
+        for stage_index in range(len(RELEASE_STAGES) - 1):
+            for pk in stream_pks:
+                queue.put_nowait((pk, stage_index))
+
+        latencies = []
+        locked = 0
+
+        async def worker():
+            nonlocal locked
+            while not queue.empty():
+                pk, stage_index = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    await verified_proof(sessions, pk, stage_index)
+                    latencies.append(time.perf_counter() - started)
+                except OperationalError as e:
+                    if "locked" not in str(e):
+                        raise
+                    locked += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        await engine.dispose()
+
+    return {
+        "profile": "tuned" if tuned else "default",
+        "transactions": len(latencies),
+        "locked_errors": locked,
+        "elapsed_seconds": round(elapsed, 3),
+        "transactions_per_second": round(len(latencies) / elapsed, 1),
+        "latency_seconds": {
+            "mean": round(statistics.mean(latencies), 4) if latencies else None,
+            "p50": round(percentile(latencies, 50), 4) if latencies else None,
+            "p95": round(percentile(latencies, 95), 4) if latencies else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = {
+        "config": {"streams": args.streams, "concurrency": args.concurrency},
+        "runs": [
+            asyncio.run(run_profile(tuned, args.streams, args.concurrency))
+            for tuned in (False, True)
+        ],
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -64,6 +64,36 @@ app.post("/streams/milestone", async (req: Request, res: Response) => {
   }
 });
 
+// Create many streams at once and release each one's initial stage
+app.post("/streams/batch", async (req: Request, res: Response) => {
+  try {
+    const { streams, tokenMint } = req.body;
+
+    if (!Array.isArray(streams) || streams.length === 0) {
+      return res.status(400).json({ error: "Missing streams" });
+    }
+    if (streams.some((s: any) => !s.recipientPublicKey || !s.totalAmountLamports || !s.initialReleaseLamports)) {
+      return res.status(400).json({
+        error: "Each stream needs recipientPublicKey, totalAmountLamports and initialReleaseLamports",
+      });
+    }
+
+    const results = await streamflowService.createStreamBatch(
+      streams.map((s: any) => ({
+        recipientPublicKey: s.recipientPublicKey,
+        totalAmountLamports: BigInt(s.totalAmountLamports),
+        initialReleaseLamports: BigInt(s.initialReleaseLamports),
+      })),
+      tokenMint
+    );
+
+    res.json({ success: true, results });
+  } catch (error: any) {
+    console.error("Batch create error:", error);
+    res.status(500).json({ error: error.message });
+  }
+});
+
 // Withdraw from stream (release funds to recipient)
 app.post("/streams/withdraw", async (req: Request, res: Response) => {
   try {
@@ -1,4 +1,12 @@
-import { StreamflowSolana, ICluster, ICreateStreamData, IWithdrawData, ICancelData } from "@streamflow/stream";
+import {
+  StreamflowSolana,
+  ICluster,
+  ICreateStreamData,
+  ICreateMultipleStreamData,
+  IRecipient,
+  IWithdrawData,
+  ICancelData,
+} from "@streamflow/stream";
 import { Keypair, clusterApiUrl } from "@solana/web3.js";
 import BN from "bn.js";
 import bs58 from "bs58";
@@ -28,6 +36,31 @@ interface CancelParams {
   streamId: string;
 }
 
+interface BatchStreamItem {
+  recipientPublicKey: string;
+  totalAmountLamports: bigint;
+  initialReleaseLamports: bigint;
+}
+
+const NATIVE_SOL_MINT = "So11111111111111111111111111111111111111112";
+
+// Initial withdrawals in a batch are separate transactions; cap how many
+// are in flight so a large batch doesn't flood the RPC node
+const BATCH_WITHDRAW_CONCURRENCY = Math.max(1, Number(process.env.BATCH_WITHDRAW_CONCURRENCY) || 8);
+
+async function mapWithConcurrency<T, R>(items: T[], limit: number, fn: (item: T, index: number) => Promise<R>) {
+  const results: R[] = new Array(items.length);
+  let next = 0;
+  const workers = Array.from({ length: Math.min(limit, items.length) }, async () => {
+    while (next < items.length) {
+      const index = next++;
+      results[index] = await fn(items[index], index);
+    }
+  });
+  await Promise.all(workers);
+  return results;
+}
+
 export class StreamflowService {
   private client: InstanceType<typeof StreamflowSolana.SolanaStreamClient>;
   private senderKeypair: Keypair;
@@ -162,6 +195,94 @@ export class StreamflowService {
     }
   }
 
+  /**
+   * Create many streams in one request and release each one's initial stage.
+   * Streamflow's createMultiple packs the creations into as few transactions
+   * as fit; the initial withdrawals then run with bounded concurrency.
+   * Returns one result per item, in input order, so a failed recipient
+   * doesn't fail the batch. A stream whose initial withdrawal fails is
+   * reported as failed but retryable, with its streamId.
+   */
+  async createStreamBatch(items: BatchStreamItem[], tokenMint?: string) {
+    console.log(`Creating batch of ${items.length} streams`);
+
+    const start = Math.floor(Date.now() / 1000) + 5;
+    const recipients: IRecipient[] = items.map((item, index) => {
+      const amountBN = new BN(item.totalAmountLamports.toString());
+      return {
+        recipient: item.recipientPublicKey,
+        amount: amountBN,
+        name: `S${index + 1}`,
+        cliffAmount: new BN(0),
+        amountPerPeriod: amountBN,
+      };
+    });
+
+    const createParams: ICreateMultipleStreamData = {
+      recipients,
+      tokenId: tokenMint || NATIVE_SOL_MINT,
+      start,
+      period: 1,
+      cliff: 0,
+      cancelableBySender: true,
+      cancelableByRecipient: false,
+      transferableBySender: false,
+      transferableByRecipient: false,
+      canTopup: false,
+      automaticWithdrawal: false,
+      withdrawalFrequency: 0,
+    };
+
+    const created = await this.client.createMultiple(createParams, {
+      sender: this.senderKeypair,
+      isNative: !tokenMint || tokenMint === NATIVE_SOL_MINT,
+    });
+
+    // metadataToRecipient holds the recipient objects we passed in, so map
+    // each created stream back to its input index by identity
+    const streamIds: (string | undefined)[] = new Array(items.length);
+    for (const [metadataId, recipient] of Object.entries(created.metadataToRecipient)) {
+      const index = recipients.indexOf(recipient as IRecipient);
+      if (index >= 0) {
+        streamIds[index] = metadataId;
+      }
+    }
+    // Errors only name the recipient; hand each one to the next uncreated
+    // item for that recipient so duplicates keep their own error
+    const createErrors = new Map<number, string>();
+    for (const e of created.errors) {
+      const index = items.findIndex(
+        (item, i) => item.recipientPublicKey === e.recipient && !streamIds[i] && !createErrors.has(i)
+      );
+      if (index >= 0) {
+        createErrors.set(index, e.error);
+      }
+    }
+
+    return mapWithConcurrency(items, BATCH_WITHDRAW_CONCURRENCY, async (item, index) => {
+      const streamId = streamIds[index];
+      if (!streamId) {
+        return {
+          index,
+          success: false,
+          error: createErrors.get(index) || "Stream was not created",
+        };
+      }
+
+      try {
+        const withdrawal = await this.withdraw({ streamId, amount: item.initialReleaseLamports });
+        return {
+          index,
+          success: true,
+          streamId,
+          withdrawSignature: withdrawal.transactionSignature,
+        };
+      } catch (error: any) {
+        return { index, success: false, retryable: true, streamId, withdrawError: error.message };
+      }
+    });
+  }
+
   /**
    * Withdraw funds from a stream (release to recipient).
    * This is called when a proof is verified to release the next stage.